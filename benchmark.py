@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from game_utils import *
+from rules import DEFAULT_RULES
+from strategy import basic_strategy
+import protocol
+import server
+import loadgen
+import load_test
+
+# --- Benchmark Suite ---
+#   python benchmark.py run [cases] [--e2e both] [--save FILE]
+#   python benchmark.py compare BASE.json NEW.json [--threshold 15]
+# run times the microbenchmarks below, then plays rounds against a local server.py
+# over loopback. --save stores every result as JSON, compare flags the results that
+# got worse by more than the threshold (and exits 1), so a change can be checked
+# against a saved baseline of the same machine.
+#
+# A result is {"value", "unit", "better": "lower" | "higher"}, keyed by name:
+#   micro/<case>            us/op    peak bytes allocated by one op stored next to it
+#   e2e/<mode>/rounds_per_s
+#   e2e/<mode>/reply_pXX    ms from sending a request or move to the first packet answering it
+
+REGRESSION_THRESHOLD = 15.0 # Percent worse than the baseline before a result is flagged
+E2E_SESSIONS = 2000
+E2E_ROUNDS = 5
+E2E_CONCURRENCY = 50
+E2E_RUNS = 3             # Best of, against scheduling noise
+
+# --- Microbenchmarks ---
+# Each case builds its inputs once and returns the operation to time.
+# Reported per operation: CPU time and the peak memory allocated while it runs.
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+@case("deck_build")
+def bench_deck_build():
+    return deck
+
+@case("shuffle")
+def bench_shuffle():
+    d = deck()
+    return d.shuffle
+
+@case("deal")
+def bench_deal():
+    # A whole deck, refilled from the shared card table
+    d = deck()
+    def run():
+        d.cards[:] = CARDS
+        for _ in range(52):
+            d.deal()
+    return run
+
+@case("shoe_deal")
+def bench_shoe_deal():
+    # Six decks, dealt to the end and reshuffled
+    s = shoe(6, 1.0)
+    def run():
+        s.reset()
+        s.shuffle()
+        while s.deal() is not None:
+            pass
+    return run
+
+@case("hand_value")
+def bench_hand_value():
+    hands = []
+    d = deck()
+    d.shuffle()
+    for _ in range(10):
+        p = player("Bench")
+        for _ in range(3):
+            p.receive_card(d.deal())
+        hands.append(p)
+    def run():
+        for p in hands:
+            p.calculate_hand_value()
+    return run
+
+@case("pack_card")
+def bench_pack_card():
+    cards = deck().cards
+    def run():
+        for c in cards:
+            server.pack_card(c)
+    return run
+
+@case("card_to_net")
+def bench_card_to_net():
+    cards = deck().cards
+    def run():
+        for c in cards:
+            server.card_to_net(c)
+    return run
+
+@case("net_to_card")
+def bench_net_to_card():
+    wire = [server.card_to_net(c) for c in deck().cards]
+    def run():
+        for r, s in wire:
+            protocol.net_to_card(r, s)
+    return run
+
+# --- Codec ---
+# The protocol module's paths next to the per-message struct calls they replace.
+
+@case("encode_struct")
+def bench_encode_struct():
+    cards = deck().cards
+    def run():
+        for c in cards:
+            struct.pack("!IbBHB", protocol.MAGIC_COOKIE, protocol.PAYLOAD_TYPE, 0, c.net_rank, c.net_suit)
+    return run
+
+@case("encode_table")
+def bench_encode_table():
+    cards = deck().cards
+    def run():
+        for c in cards:
+            protocol.pack_card(c)
+    return run
+
+@case("decode_struct")
+def bench_decode_struct():
+    packets = [protocol.pack_card(c) for c in deck().cards]
+    def run():
+        for data in packets:
+            _, _, res, rank, suit = struct.unpack("!IbBHB", data)
+            protocol.net_to_card(rank, suit)
+    return run
+
+@case("decode_table")
+def bench_decode_table():
+    packets = [protocol.pack_card(c) for c in deck().cards]
+    def run():
+        for data in packets:
+            protocol.decode_payload(data)
+    return run
+
+@case("payload_reader")
+def bench_payload_reader():
+    # 52 packets through a local socket pair into the reader's buffer
+    a, b = socket.socketpair()
+    stream = b"".join(protocol.pack_card(c) for c in deck().cards)
+    reader = protocol.payload_reader(b)
+    def run():
+        a.sendall(stream)
+        for _ in range(52):
+            reader.read()
+    return run
+
+@case("pack_round")
+def bench_pack_round():
+    cards = deck().cards
+    player_cards, dealer_cards = cards[:3], cards[3:6]
+    def run():
+        protocol.pack_round(protocol.MSG_WIN, player_cards, dealer_cards)
+    return run
+
+@case("game_round")
+def bench_game_round():
+    # A full round with the game classes and no I/O: deal, basic strategy, dealer turn, result
+    p = player("Bench")
+    d = dealer(rules=DEFAULT_RULES)
+    g = game(d, p, shoe(DEFAULT_RULES.decks, 0.0))
+    def run():
+        g.start_round()
+        up = d.hand[0].value()
+        while not p.is_busted() and basic_strategy(p.total, p.soft, up):
+            p.receive_card(g.deck.deal())
+        if not p.is_busted():
+            d.play_turn(g.deck)
+        DEFAULT_RULES.outcome(p.total, len(p.hand), d.total, len(d.hand))
+    return run
+
+def measure(op, repeat=5):
+    """Returns (seconds per op, peak bytes allocated by one op)"""
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    op()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return best, peak
+
+# --- End to End ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((load_test.HOST, 0))
+        return s.getsockname()[1]
+
+def run_e2e(mode, sessions=E2E_SESSIONS, rounds=E2E_ROUNDS, concurrency=E2E_CONCURRENCY, runs=E2E_RUNS):
+    """The best of `runs` load runs against a fresh server.py: (rounds/s, reply latency histogram)"""
+    port = free_port()
+    proc = load_test.start_server(mode, port, "--metrics-port", "0")
+    best = None
+    try:
+        for _ in range(runs):
+            stats, elapsed = asyncio.run(loadgen.run_load(
+                load_test.HOST, port, sessions, rounds, loadgen.POLICIES['basic'], concurrency=concurrency))
+            if stats.session_errors or stats.connect_errors:
+                raise RuntimeError(f"{mode}: {stats.session_errors + stats.connect_errors} sessions failed")
+            if best is None or stats.rounds / elapsed > best[0]:
+                best = (stats.rounds / elapsed, stats.reply_latency)
+    finally:
+        proc.kill()
+        proc.wait()
+    return best
+
+# --- Results ---
+
+def result(value, unit, better="lower", **extra):
+    return {"value": value, "unit": unit, "better": better, **extra}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    results = {}
+    for name in args.cases or ([] if args.e2e_only else CASES):
+        seconds, peak = measure(CASES[name]())
+        results[f"micro/{name}"] = result(seconds * 1e6, "us/op", peak_bytes=peak)
+        print(f"{name:<14} {seconds * 1e6:10.2f} us/op {peak:10d} B peak")
+
+    modes = {"none": [], "both": ["threaded", "asyncio"]}.get(args.e2e, [args.e2e])
+    if modes:
+        raise_fd_limit()
+    for mode in modes:
+        rate, latency = run_e2e(mode, args.sessions, args.rounds, args.concurrency, args.runs)
+        results[f"e2e/{mode}/rounds_per_s"] = result(rate, "rounds/s", "higher")
+        for p in (50, 95, 99):
+            results[f"e2e/{mode}/reply_p{p}"] = result(latency.percentile(p) * 1000, "ms")
+        print(f"{bcolors.HEADER}{mode:<14}{bcolors.ENDC} {rate:10.1f} rounds/s  reply latency {latency.summary()}")
+
+    if args.save:
+        report = {
+            "meta": {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "e2e": {"sessions": args.sessions, "rounds": args.rounds, "concurrency": args.concurrency},
+            },
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+
+def compare(base_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """Prints every result both files have, returns the names of the regressions"""
+    with open(base_path) as f:
+        base = json.load(f)["results"]
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    regressions = []
+    for name in [n for n in base if n in new]:
+        old, cur = base[name]["value"], new[name]["value"]
+        if old <= 0:
+            change = 0.0 # e.g. a latency below the histogram's resolution, no base to compare with
+        else:
+            change = (cur - old) / old * 100
+        worse = change if new[name]["better"] == "lower" else -change
+        if worse > threshold:
+            regressions.append(name)
+            color = bcolors.FAIL
+        elif worse < -threshold:
+            color = bcolors.GREEN
+        else:
+            color = ""
+        print(f"{color}{name:<28} {old:12.3f} -> {cur:12.3f} {new[name]['unit']:<9} {change:+7.1f}%"
+              f"{'  REGRESSION' if name in regressions else ''}{bcolors.ENDC if color else ''}")
+    missing = [n for n in base if n not in new]
+    if missing:
+        print(f"{bcolors.WARNING}Not in {new_path}: {', '.join(missing)}{bcolors.ENDC}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the game core, the packet codec and the server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="run the benchmarks")
+    r.add_argument("cases", nargs="*", help=f"microbenchmarks to run (default: all of {', '.join(CASES)})")
+    r.add_argument("--e2e", choices=["none", "threaded", "asyncio", "both"], default="both",
+                   help="server modes to play rounds against over loopback")
+    r.add_argument("--e2e-only", action="store_true", help="skip the microbenchmarks")
+    r.add_argument("--sessions", type=int, default=E2E_SESSIONS, help="sessions per end-to-end run")
+    r.add_argument("--rounds", type=int, default=E2E_ROUNDS, help="rounds per session")
+    r.add_argument("--concurrency", type=int, default=E2E_CONCURRENCY, help="sessions open at the same time")
+    r.add_argument("--runs", type=int, default=E2E_RUNS, help="end-to-end runs per mode, the best counts")
+    r.add_argument("--save", metavar="FILE", help="store the results as JSON")
+    c = sub.add_parser("compare", help="compare two saved runs and flag regressions")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                   help=f"percent worse than the base that counts as a regression (default: {REGRESSION_THRESHOLD:g})")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        unknown = [name for name in args.cases if name not in CASES]
+        if unknown:
+            parser.error(f"unknown cases: {', '.join(unknown)}")
+        run(args)
+    else:
+        regressions = compare(args.base, args.new, args.threshold)
+        if regressions:
+            print(f"{bcolors.FAIL}{len(regressions)} regressions over {args.threshold:g}%{bcolors.ENDC}")
+            sys.exit(1)
+        print(f"{bcolors.GREEN}No regressions over {args.threshold:g}%{bcolors.ENDC}")
+
+if __name__ == "__main__":
+    main()
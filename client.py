@@ -1,41 +1,82 @@
+import argparse
+import asyncio
 import socket
-import struct
 import sys
-import time
 # Ensure game_utils.py is in the same directory
 from game_utils import *
+from strategy import load_strategy
+from composition import composition_engine
+from rules import DEFAULT_RULES, DEFAULT_SPEC, parse_rules
+from discovery import SELECT_POLICIES, discovery_service
+from connpool import connection_pool
+from protocol import (BATCH_REQUEST_TYPE, DOUBLE, HIT, KEEPALIVE_FLAG, MAGIC_COOKIE, MSG_LOSS, MSG_ONGOING, MSG_WIN,
+                      REQUEST_TYPE, ROUND_HEADER, ROUND_HEADER_SIZE, STAND, STRATEGY_HEADER, STRATEGY_TYPE, SURRENDER,
+                      decode_cards, pack_request, payload_reader)
+import loadgen
 
 # --- Config ---
 TEAM_NAME = "TeamJoker"
-MAGIC_COOKIE = 0xabcddcba
-UDP_PORT = 13122
-OFFER_TYPE = 0x2
-REQUEST_TYPE = 0x3
-PAYLOAD_TYPE = 0x4
-MSG_WIN = 0x3
-MSG_LOSS = 0x2
-MSG_TIE = 0x1
-MSG_ONGOING = 0x0
-
-SUIT_MAP = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-
-def net_to_card(r, s):
-    # Convert protocol rank to string
-    if r == 1: rank_str = 'Ace'
-    elif r == 11: rank_str = 'Jack'
-    elif r == 12: rank_str = 'Queen'
-    elif r == 13: rank_str = 'King'
-    else: rank_str = str(r)
-    
-    # --- FIX: s is 1-4, but list index is 0-3 ---
-    if 1 <= s <= 4:
-        suit_str = SUIT_MAP[s-1]
-    else:
-        suit_str = "Unknown"
-        
-    return card(rank_str, suit_str)
 
-def start_client():
+def recv_round(conn):
+    """
+    Reads one batch frame. Returns (result, player_cards, dealer_cards), or None if the server closed.
+    """
+    header = recv_exact(conn, ROUND_HEADER_SIZE)
+    if len(header) < ROUND_HEADER_SIZE:
+        return None
+    cookie, mtype, res, n_player, n_dealer = ROUND_HEADER.unpack(header)
+    body = recv_exact(conn, 3 * (n_player + n_dealer))
+    if len(body) < 3 * (n_player + n_dealer):
+        return None
+    return res, decode_cards(body, n_player), decode_cards(body, n_dealer, 3 * n_player)
+
+def play_batch(conn, rounds, strategy, keep_alive=False):
+    """
+    Batch mode: hands the server a strategy table, then reads one frame per round.
+    """
+    mtype = BATCH_REQUEST_TYPE | KEEPALIVE_FLAG if keep_alive else BATCH_REQUEST_TYPE
+    conn.sendall(pack_request(mtype, rounds, TEAM_NAME))
+    conn.sendall(STRATEGY_HEADER.pack(MAGIC_COOKIE, STRATEGY_TYPE, 1) + strategy.bitmap)
+
+    wins = 0
+    for r in range(1, rounds + 1):
+        frame = recv_round(conn)
+        if frame is None:
+            print("Connection closed by server")
+            return wins
+        res, my_cards, dealer_cards = frame
+        outcome = {MSG_WIN: f"{bcolors.GREEN}Won{bcolors.ENDC}",
+                   MSG_LOSS: f"{bcolors.FAIL}Lost{bcolors.ENDC}"}.get(res, f"{bcolors.WARNING}Tie{bcolors.ENDC}")
+        print(f"Round {r}: {outcome} | You: {', '.join(map(str, my_cards))} | Dealer: {', '.join(map(str, dealer_cards))}")
+        if res == MSG_WIN:
+            wins += 1
+    return wins
+
+def discover_server(discovery=None, policy="rtt"):
+    """
+    The best server the discovery service knows of, waiting for one if none is known yet.
+    Returns (ip, tcp port), or None on Ctrl+C.
+    """
+    if discovery is None:
+        discovery = discovery_service().start()
+    if not discovery.live():
+        print(f"\n{bcolors.BLUE}Client started, listening for offer requests...{bcolors.ENDC}")
+    try:
+        server = discovery.choose(policy)
+    except KeyboardInterrupt:
+        return None
+    print(f"Received offer from {bcolors.CYAN}{server}{bcolors.ENDC}")
+    return server.ip, server.port
+
+def start_client(batch=False, strategy=None, counter=None, discovery=None, select="rtt", pool=None, rules=DEFAULT_RULES):
+    """
+    Plays one session, on the server the discovery service picks by `select`.
+    With a pool (connpool.connection_pool) the session is a keep-alive request on a
+    pooled connection, which goes back to the pool afterwards. With a strategy (see strategy.load_strategy) the hit/stand
+    decisions are looked up instead of asked for; batch sends the whole table to the server.
+    With a counter (composition_engine) every card seen is counted and decides instead.
+    rules are the server's (--rules): double and surrender are only offered where they allow them.
+    """
     try:
         # Prompt for rounds
         print(f"{bcolors.BOLD}How many rounds to play? (Enter 0 to quit): {bcolors.ENDC}", end='', flush=True)
@@ -55,79 +96,76 @@ def start_client():
         print(f"{bcolors.WARNING}Invalid input. Defaulting to 1 round.{bcolors.ENDC}")
         rounds = 1
 
-    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    udp.bind(('', UDP_PORT))
-    
-    # Timeout for UDP so we can check for Ctrl+C
-    udp.settimeout(1.0)
-    
-    print(f"\n{bcolors.BLUE}Client started, listening for offer requests...{bcolors.ENDC}")
-    
-    server_ip = None
-    server_port = None
-    
-    # UDP Listening Loop
-    while True:
-        try:
-            data, addr = udp.recvfrom(1024)
-            if len(data) < 39: continue
-            cookie, mtype, port, name_b = struct.unpack("!IbH32s", data[:39])
-            if cookie == MAGIC_COOKIE and mtype == OFFER_TYPE:
-                server_ip = addr[0]
-                server_port = port
-                s_name = name_b.decode().strip('\x00')
-                print(f"Received offer from {bcolors.CYAN}{s_name}{bcolors.ENDC} at {server_ip}")
-                break
-        except socket.timeout:
-            pass # Loop back to allow Ctrl+C check
-        except KeyboardInterrupt:
-            return False
-    
-    udp.close()
+    server = discover_server(discovery, select)
+    if server is None:
+        return False
+    server_ip, server_port = server
     
     # TCP Connection
     try:
-        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        conn.connect((server_ip, server_port))
+        reused = False
+        if pool is not None:
+            conn, reused = pool.get(server_ip, server_port)
+        else:
+            conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.connect((server_ip, server_port))
         
         # --- VALIDATION: Confirm connection ---
-        print(f"{bcolors.GREEN}TCP connection established successfully with {server_ip}:{server_port}{bcolors.ENDC}")
+        if reused:
+            print(f"{bcolors.GREEN}Reusing the TCP connection with {server_ip}:{server_port}{bcolors.ENDC}")
+        else:
+            print(f"{bcolors.GREEN}TCP connection established successfully with {server_ip}:{server_port}{bcolors.ENDC}")
         
         conn.settimeout(15.0) 
         
+        if counter and not reused:
+            counter.reset() # Every connection is dealt from a new shoe, kept for all its requests
+        if batch:
+            wins = play_batch(conn, rounds, strategy, pool is not None)
+            print(f"\n{bcolors.BOLD}Finished playing {rounds} rounds, win rate: {wins/rounds:.2%}{bcolors.ENDC}")
+            release(conn, server, pool)
+            return True
+
         # Send Request
-        conn.sendall(struct.pack("!IbB32s", MAGIC_COOKIE, REQUEST_TYPE, rounds, TEAM_NAME.encode().ljust(32, b'\x00')))
+        mtype = REQUEST_TYPE | KEEPALIVE_FLAG if pool is not None else REQUEST_TYPE
+        conn.sendall(pack_request(mtype, rounds, TEAM_NAME))
         conn.sendall(b'\n') # Requirement mentions a line break
+        reader = payload_reader(conn)
         
         wins = 0
         for r in range(1, rounds + 1):
             print(f"\n{bcolors.HEADER}--- Round {r} ---{bcolors.ENDC}")
             
             my_p = player("Me") 
+            if counter:
+                counter.new_round()
             cards_seen = 0
             my_turn = True 
+            doubled = False
+            revealed = False # The dealer's first card after our turn is the hole card
             round_over = False
 
             while not round_over:
                 try:
-                    # Expecting exactly 9 bytes for a message
-                    data = conn.recv(9) 
+                    # Every message is exactly 9 bytes, read into the reader's buffer
+                    message = reader.read()
                 except socket.timeout:
                     print(f"{bcolors.FAIL}Server timed out. Game over.{bcolors.ENDC}")
                     return True
 
-                if not data: 
+                if message is None: 
                     print("Connection closed by server")
                     return True
                 
-                cookie, mtype, res, rank, suit = struct.unpack("!IbBHB", data)
+                res, c_obj = message
                 
                 # --- CASE 1: Game Over (Win/Loss/Tie) ---
                 if res != MSG_ONGOING:
                     # If server sent a card along with the result (e.g., the bust card)
-                    if rank != 0: 
-                        c_obj = net_to_card(rank, suit)
+                    if c_obj is not None: 
+                        if counter:
+                            counter.see(c_obj)
                         my_p.receive_card(c_obj)
                         print(f"You got: {c_obj}")
                     
@@ -143,20 +181,26 @@ def start_client():
                     continue # Break inner loop, go to next round in for loop
 
                 # --- CASE 2: Ongoing Game (Receive Card) ---
-                c_obj = net_to_card(rank, suit)
+                if counter:
+                    counter.see(c_obj)
                 cards_seen += 1
                 
                 if cards_seen <= 2:
                     my_p.receive_card(c_obj)
                     print(f"You got: {c_obj}")
                 elif cards_seen == 3:
+                    dealer_up = c_obj
                     print(f"Dealer shows: {c_obj}")
-                elif cards_seen == 4 and not my_turn:
-                    print(f"Dealer reveals: {c_obj}")
                 else:
                     if my_turn:
                         my_p.receive_card(c_obj)
                         print(f"You got: {c_obj}")
+                        if doubled:
+                            my_turn = False # A doubled hand gets exactly one card
+                            print(f"{bcolors.WARNING}Waiting for dealer...{bcolors.ENDC}")
+                    elif not revealed:
+                        revealed = True
+                        print(f"Dealer reveals: {c_obj}")
                     else:
                         print(f"Dealer draws: {c_obj}")
 
@@ -169,14 +213,37 @@ def start_client():
                     if my_p.calculate_hand_value() > 21:
                          # We rely on server to send the Loss message next, so we don't ask for input
                          pass 
+                    elif not my_turn:
+                         pass # Doubled, the dealer plays next
                     else:
-                        print(f"Action ({bcolors.GREEN}hit{bcolors.ENDC}/{bcolors.FAIL}stand{bcolors.ENDC}): ", end='', flush=True)
-                        choice = sys.stdin.readline().strip().lower()
+                        # The server would stand on a double or surrender its rules refuse, and the next
+                        # card would be the dealer's: only offer what they allow
+                        first_move = len(my_p.hand) == 2
+                        can_double = first_move and rules.can_double[my_p.soft][my_p.total]
+                        can_surrender = first_move and rules.surrender
+                        extra = ("/double" if can_double else "") + ("/surrender" if can_surrender else "")
+                        print(f"Action ({bcolors.GREEN}hit{bcolors.ENDC}/{bcolors.FAIL}stand{bcolors.ENDC}{extra}): ", end='', flush=True)
+                        if counter:
+                            choice = 'hit' if counter.should_hit(my_p.total, my_p.soft, dealer_up.value()) else 'stand'
+                            print(choice)
+                        elif strategy:
+                            choice = 'hit' if strategy.should_hit(my_p.total, my_p.soft, dealer_up.value()) else 'stand'
+                            print(choice)
+                        else:
+                            choice = sys.stdin.readline().strip().lower()
                         
                         if choice == 'hit':
-                            conn.sendall(struct.pack("!Ib5s", MAGIC_COOKIE, PAYLOAD_TYPE, b"Hittt"))
+                            conn.sendall(HIT)
+                        elif choice == 'double' and can_double:
+                            conn.sendall(DOUBLE)
+                            doubled = True
+                        elif choice == 'surrender' and can_surrender:
+                            conn.sendall(SURRENDER)
+                            my_turn = False
                         else:
-                            conn.sendall(struct.pack("!Ib5s", MAGIC_COOKIE, PAYLOAD_TYPE, b"Stand"))
+                            if choice in ('double', 'surrender'):
+                                print(f"{bcolors.WARNING}Can't {choice} this hand, standing.{bcolors.ENDC}")
+                            conn.sendall(STAND)
                             my_turn = False 
                             print(f"{bcolors.WARNING}Waiting for dealer...{bcolors.ENDC}")
 
@@ -186,21 +253,92 @@ def start_client():
         else:
             print("\nNo rounds played.")
             
-        conn.close()
+        release(conn, server, pool)
         return True # Continue main loop
         
     except Exception as e:
         print(f"{bcolors.FAIL}Error: {e}{bcolors.ENDC}")
         return True # Continue main loop
 
+def release(conn, server, pool):
+    """After a complete session: back to the pool for the next one, or closed"""
+    if pool is not None:
+        pool.put(*server, conn)
+    else:
+        conn.close()
+
+def run_load(args):
+    """
+    Load generator mode: no prompts, --load sessions played by a policy (batched with --batch).
+    """
+    raise_fd_limit()
+    server = (args.host, args.port) if args.host else discover_server(discovery_service(args.probe).start(), args.select)
+    if server is None:
+        return
+    print(f"{bcolors.BLUE}Running {args.load} sessions x {args.rounds} rounds against {server[0]}:{server[1]}...{bcolors.ENDC}")
+    stats, elapsed = asyncio.run(loadgen.run_load(
+        server[0], server[1], args.load, args.rounds, loadgen.load_policy(args.policy),
+        args.concurrency, args.batch, args.keep_alive))
+    print(loadgen.report(stats, elapsed))
+
 def main():
+    parser = argparse.ArgumentParser(description="Blackjack client")
+    parser.add_argument("--auto", action="store_true",
+                        help="decide hit/stand from the solved strategy table instead of asking")
+    parser.add_argument("--batch", action="store_true",
+                        help="send the solved strategy table to the server, one frame per round")
+    parser.add_argument("--count", action="store_true",
+                        help="decide hit/stand from the composition of the cards left in the shoe")
+    parser.add_argument("--rules", default=DEFAULT_SPEC,
+                        help=f"the server's rule set (picks the table, default: {DEFAULT_SPEC})")
+    parser.add_argument("--decks", type=int, default=None, help="decks the server deals from, overrides --rules")
+    parser.add_argument("--penetration", type=float, default=0.0,
+                        help="the server's reshuffle point, for --count (0 = fresh shoe every round)")
+
+    load = parser.add_argument_group("load generator")
+    load.add_argument("--load", type=int, metavar="SESSIONS",
+                      help="play this many automatic sessions concurrently and report throughput/latency")
+    load.add_argument("--rounds", type=int, default=10, help="rounds per load session (1-255)")
+    load.add_argument("--policy", default="basic",
+                      help=f"{', '.join(loadgen.POLICIES)} or module:function")
+    load.add_argument("--concurrency", type=int, default=1000, help="sessions open at the same time")
+    parser.add_argument("--keep-alive", action="store_true",
+                        help="keep connections open and send the next session's request on them")
+    parser.add_argument("--select", choices=SELECT_POLICIES, default="rtt",
+                        help="which discovered server to play on: lowest round trip time or lowest load")
+    parser.add_argument("--probe", action="append", default=[], metavar="HOST",
+                        help="also probe this host directly, for servers whose broadcasts don't reach us")
+    load.add_argument("--host", help="server address, with --port (default: wait for an offer)")
+    load.add_argument("--port", type=int, help="server TCP port, with --host")
+    args = parser.parse_args()
+    try:
+        rules = parse_rules(args.rules, args.decks)
+    except ValueError as e:
+        parser.error(f"--rules: {e}")
+    if not 0 <= args.penetration < 1:
+        parser.error("--penetration must be at least 0 and below 1")
+    if (args.host is None) != (args.port is None):
+        parser.error("--host and --port must be given together")
+
+    if args.load:
+        run_load(args)
+        return
+
+    # Loaded from the on-disk cache, solved only the first time a rule set is used
+    strategy = load_strategy(rules.decks, rules.hit_soft_17) if args.auto or args.batch else None
+    # One counter for the whole run so its EV cache is kept, the count restarts every session
+    counter = composition_engine(rules.decks, args.penetration, hit_soft_17=rules.hit_soft_17) if args.count else None
+
+    # One discovery service for the whole run: later sessions pick from its table at once
+    discovery = discovery_service(args.probe).start()
+    pool = connection_pool() if args.keep_alive else None
+
     while True:
         try:
             # If start_client returns False, it means user wants to quit
-            should_continue = start_client()
+            should_continue = start_client(args.batch, strategy, counter, discovery, args.select, pool, rules)
             if not should_continue:
                 break
-            time.sleep(1)
         except KeyboardInterrupt:
             print(f"\n{bcolors.WARNING}Game terminated by user. Goodbye!{bcolors.ENDC}")
             break
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from game_utils import cut_card
+from strategy import FULL_DECK, add_value, dealer_finals, player_evs, value_slot
+
+# --- Composition-Dependent Strategy ---
+# Tracks the cards left in the shoe as the client sees them and decides hit/stand
+# from the remaining composition: the dealer's odds are exact for what is really left,
+# and the player's draws are weighted by it too.
+#
+# Each (upcard, composition) is solved from scratch into EVs for every player total. The
+# result is kept in an LRU of fixed size, so a long session holds bounded memory. This is
+# a cache, not an incremental update: it only pays off when the same composition comes up
+# again (e.g. a fresh shoe every round), a newly seen card always costs a full re-solve.
+
+EV_CACHE_SIZE = 4096
+
+class composition_engine:
+    """
+    Running remaining-deck composition plus the hit/stand decision for it.
+    penetration matches the server's shoe: 0 means a fresh shoe every round,
+    hit_soft_17 its dealer rule.
+    """
+    def __init__(self, decks=1, penetration=0.0, cache_size=EV_CACHE_SIZE, hit_soft_17=False):
+        self.full = tuple(count * decks for count in FULL_DECK)
+        self.hit_soft_17 = hit_soft_17
+        self.cut = cut_card(sum(self.full), penetration) # Where the server's shoe reshuffles
+        self.cache_size = cache_size
+        self.evs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reset()
+
+    def reset(self):
+        """A freshly shuffled shoe"""
+        self.comp = self.full
+        self.seen = 0
+
+    def new_round(self):
+        """Called before each round: resets once the shoe has passed its cut card"""
+        if self.seen >= self.cut:
+            self.reset()
+
+    def see(self, card):
+        """Folds a card the client has seen into the composition"""
+        slot = value_slot(card.value())
+        if not self.comp[slot]:
+            # More of this card than a full shoe holds: the server must have reshuffled
+            self.reset()
+        self.comp = self.comp[:slot] + (self.comp[slot] - 1,) + self.comp[slot + 1:]
+        self.seen += 1
+
+    def decision_evs(self, total, soft, upcard):
+        """(stand EV, hit EV) for the hand against the current composition"""
+        return self.solve(upcard, self.comp)[(total, soft)]
+
+    def should_hit(self, total, soft, upcard):
+        if not soft and total <= 11:
+            return True # No card can bust it, and standing can't beat any total it reaches
+        stand, hit = self.decision_evs(total, soft, upcard)
+        return hit > stand
+
+    def solve(self, upcard, comp):
+        """{(total, soft): (stand EV, hit EV)} against an upcard with comp left (upcard already out)"""
+        key = (upcard, comp)
+        cached = self.evs.get(key)
+        if cached is not None:
+            self.evs.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        # The dealer draws the hole card from comp
+        evs = player_evs(dealer_finals(*add_value(0, False, upcard), comp, self.hit_soft_17), comp)
+        self.evs[key] = evs
+        if len(self.evs) > self.cache_size:
+            self.evs.popitem(last=False)
+        return evs
@@ -0,0 +1,98 @@
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+# --- Connection Pool ---
+# Keep-alive connections to game servers, for clients that send many requests (see
+# KEEPALIVE_FLAG in server.client_session). After its rounds a connection goes back to
+# the pool, and the next request to the same server takes it instead of paying for a
+# TCP handshake (and, on a threaded server, a new thread).
+#
+# The server closes a connection that stays idle past its client timeout, so idle
+# connections are dropped after IDLE_TIMEOUT, and one that the server has closed in the
+# meantime is noticed before it is handed out: an idle keep-alive connection has
+# nothing to read, so a readable one is at EOF (or broken).
+
+IDLE_TIMEOUT = 30.0  # Seconds, below the server's default client timeout (60 s)
+MAX_IDLE = 8         # Idle connections kept per server
+
+def is_closed(sock):
+    """True if an idle connection was closed by the server"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+class connection_pool:
+    """Blocking sockets by (host, port), thread safe"""
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_idle=MAX_IDLE):
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.idle = {} # (host, port) -> deque of (socket, idle since)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def get(self, host, port, timeout=None):
+        """(socket, reused): an idle connection to host:port if one is still open, else a new one"""
+        with self.lock:
+            idle = self.idle.get((host, port))
+            while idle:
+                sock, since = idle.pop() # Most recently used first, the least likely to be closed
+                if time.monotonic() - since < self.idle_timeout and not is_closed(sock):
+                    self.reused += 1
+                    return sock, True
+                sock.close()
+        sock = socket.create_connection((host, port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.opened += 1
+        return sock, False
+
+    def put(self, host, port, sock):
+        """Hands back a connection whose request is complete, ready for the next one"""
+        with self.lock:
+            idle = self.idle.setdefault((host, port), deque())
+            idle.append((sock, time.monotonic()))
+            while len(idle) > self.max_idle:
+                idle.popleft()[0].close()
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for sock, _ in idle:
+                    sock.close()
+            self.idle.clear()
+
+class async_connection_pool:
+    """The same for asyncio (reader, writer) pairs, used from a single event loop"""
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_idle=MAX_IDLE):
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.idle = {}
+        self.reused = 0
+
+    def take(self, host, port):
+        """An idle (reader, writer) to host:port that is still open, or None: connect then"""
+        idle = self.idle.get((host, port))
+        while idle:
+            reader, writer, since = idle.pop()
+            if time.monotonic() - since < self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer
+            writer.close()
+        return None
+
+    def put(self, host, port, reader, writer):
+        idle = self.idle.setdefault((host, port), deque())
+        idle.append((reader, writer, time.monotonic()))
+        while len(idle) > self.max_idle:
+            idle.popleft()[1].close()
+
+    def close(self):
+        for idle in self.idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self.idle.clear()
@@ -1,10 +1,13 @@
 
 from player import player
+from rules import DEFAULT_RULES
 
 
 class dealer(player):
-    def __init__(self, name="Dealer"):
+    def __init__(self, name="Dealer", rules=DEFAULT_RULES):
         super().__init__(name)
+        self.rules = rules
+        self.hits = rules.dealer_hits # [soft][total], H17 or S17 is one lookup either way
 
     def show_initial_card(self):
         if self.hand:
@@ -12,7 +15,7 @@ class dealer(player):
         return f"{self.name} has no cards to show."
     
     def should_hit(self):
-        return self.calculate_hand_value() < 17
+        return self.hits[self.soft][self.total]
     
     def play_turn(self, deck):
         while self.should_hit():
@@ -1,24 +1,48 @@
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace']
+
 class card:
-    def __init__(self, rank, suit):
+    """
+    A playing card. The 52 cards are built once (CARDS, indexed by card id 0-51)
+    and card(rank, suit) hands back the shared instance. The value is precomputed.
+    """
+    __slots__ = ('id', 'rank', 'suit', 'points', 'label')
+
+    def __new__(cls, rank, suit):
+        known = CARD_INDEX.get((rank, suit))
+        if known is not None:
+            return known
+        return cls._build(rank, suit, -1)
+
+    @classmethod
+    def _build(cls, rank, suit, card_id):
+        self = object.__new__(cls)
+        self.id = card_id
         self.rank = rank
         self.suit = suit
+        if rank in ['Jack', 'Queen', 'King']:
+            self.points = 10
+        elif rank == 'Ace':
+            self.points = 11
+        else:
+            self.points = int(rank)
+        self.label = f"{rank} of {suit}"
+        return self
         
     def __repr__(self):
-        return f"{self.rank} of {self.suit}"
+        return self.label
     
     def value(self):
-        if self.rank in ['Jack', 'Queen', 'King']:
-            return 10
-        elif self.rank == 'Ace':
-            return 11
-        else:
-            return int(self.rank)
+        return self.points
+
+CARD_INDEX = {}
+CARDS = [card._build(rank, suit, i) for i, (suit, rank) in enumerate((s, r) for s in SUITS for r in RANKS)]
+CARD_INDEX.update(((c.rank, c.suit), c) for c in CARDS)
+
 class deck:
 
     def __init__(self):
-        suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-        ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace']
-        self.cards = [card(rank, suit) for suit in suits for rank in ranks]
+        self.cards = list(CARDS)
 
     def __repr__(self):
         return f"Deck of {len(self.cards)} cards"
@@ -37,4 +61,6 @@ class deck:
         return self.cards[-1] if self.cards else None   
     def add_card(self, card):
         self.cards.append(card)
+    def needs_shuffle(self):
+        return True # A single deck is rebuilt and shuffled every round
         
\ No newline at end of file
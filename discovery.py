@@ -0,0 +1,190 @@
+import itertools
+import select
+import socket
+import struct
+import threading
+import time
+from protocol import MAGIC_COOKIE, OFFER_TYPE
+
+# --- Server Discovery ---
+# Servers broadcast an offer on UDP_PORT every second. Instead of binding a socket and
+# waiting for the next offer on every connect, a client runs one discovery_service for
+# its whole life: a background thread keeps a table of the servers it has heard from,
+# each entry expiring OFFER_TTL seconds after its last offer, and actively probes them.
+#
+# A probe is a small datagram to PROBE_PORT (broadcast, plus any unicast targets and the
+# servers already known). The server answers at once with an offer sent back to the
+# probing socket that echoes the probe's nonce, which gives the round trip time, and
+# carries the server's load. choose() then picks from the table without waiting.
+#
+# An offer is the legacy 39 bytes (Cookie, Type, TCP port, Name) followed by
+#   Active sessions (2), Session capacity (2), Nonce (4, 0 in the periodic broadcast)
+# Legacy clients only read the first 39 bytes.
+# A probe is Cookie (4), Type (1), Nonce (4), zero padded to the size of an offer.
+
+PROBE_TYPE = 0x8
+UDP_PORT = 13122
+PROBE_PORT = 13123
+OFFER = struct.Struct("!IbH32sHHI")
+LEGACY_OFFER = struct.Struct("!IbH32s")
+# Cookie, Type, Nonce, padded to the size of the answer so a spoofed probe can't amplify traffic
+PROBE = struct.Struct(f"!IbI{OFFER.size - 9}x")
+LOAD_UNKNOWN = 0xFFFF          # Sessions, when the advertiser can't count them (pre-fork workers)
+
+OFFER_TTL = 3.5        # Seconds a server stays in the table after its last offer (3 missed broadcasts)
+PROBE_INTERVAL = 1.0   # Seconds between probes of the background thread
+PENDING_PROBES = 64    # Nonces remembered for RTT matching
+SELECT_POLICIES = ("rtt", "load")
+
+def pack_offer(tcp_port, name, sessions=LOAD_UNKNOWN, capacity=0, nonce=0):
+    return OFFER.pack(MAGIC_COOKIE, OFFER_TYPE, tcp_port, name.encode().ljust(32, b'\x00'),
+                      min(sessions, LOAD_UNKNOWN), min(capacity, 0xFFFF), nonce)
+
+class server_entry:
+    __slots__ = ('ip', 'port', 'name', 'seen', 'rtt', 'sessions', 'capacity')
+
+    def __init__(self, ip, port, name):
+        self.ip = ip
+        self.port = port
+        self.name = name
+        self.seen = 0.0
+        self.rtt = None # Seconds, from the last answered probe
+        self.sessions = LOAD_UNKNOWN
+        self.capacity = 0
+
+    def load(self):
+        """Share of the server's session capacity in use, 1.0 when it isn't known"""
+        if self.sessions == LOAD_UNKNOWN or not self.capacity:
+            return 1.0
+        return self.sessions / self.capacity
+
+    def __repr__(self):
+        rtt = f"{self.rtt * 1000:.2f} ms" if self.rtt is not None else "-"
+        load = "?" if self.sessions == LOAD_UNKNOWN or not self.capacity else f"{self.load():.0%}"
+        return f"{self.name} at {self.ip}:{self.port} (rtt {rtt}, load {load})"
+
+class discovery_service:
+    """
+    Live table of servers, kept fresh by a background thread. Start it once per process.
+    targets: extra hosts to probe directly, for servers whose broadcasts don't reach us.
+    """
+    def __init__(self, targets=(), ttl=OFFER_TTL, probe_interval=PROBE_INTERVAL, broadcast=True):
+        self.targets = list(targets)
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.broadcast = broadcast
+        self.servers = {}   # (ip, tcp port) -> server_entry
+        self.pending = {}   # nonce -> send time (a broadcast probe is answered by every server)
+        self.nonces = itertools.count(1)
+        self.changed = threading.Condition()
+        self.running = False
+
+        # Periodic offers arrive on the well-known port, shared with other clients on the host
+        self.listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.listen.bind(('', UDP_PORT))
+        except OSError:
+            # Only probe answers then, they come back to our own port
+            self.listen.close()
+            self.listen = None
+        # Probes go out from a port of our own, so every answer comes back to this process
+        self.probe_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.probe_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.probe_sock.bind(('', 0))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, name="discovery", daemon=True).start()
+        return self
+
+    def close(self):
+        self.running = False
+
+    def probe(self):
+        """Asks every reachable server for an offer now"""
+        addresses = {(host, PROBE_PORT) for host in self.targets}
+        with self.changed:
+            addresses.update((e.ip, PROBE_PORT) for e in self.servers.values())
+        if self.broadcast:
+            addresses.add(('<broadcast>', PROBE_PORT))
+        for address in addresses:
+            nonce = next(self.nonces) & 0xFFFFFFFF or 1
+            with self.changed:
+                self.pending[nonce] = time.perf_counter()
+                if len(self.pending) > PENDING_PROBES:
+                    self.pending.pop(next(iter(self.pending)))
+            try:
+                self.probe_sock.sendto(PROBE.pack(MAGIC_COOKIE, PROBE_TYPE, nonce), address)
+            except OSError:
+                pass # No route for a broadcast or an unreachable target, the others still go out
+
+    def run(self):
+        socks = [s for s in (self.listen, self.probe_sock) if s is not None]
+        next_probe = 0.0
+        while self.running:
+            now = time.monotonic()
+            if now >= next_probe:
+                self.probe()
+                next_probe = now + self.probe_interval
+            ready, _, _ = select.select(socks, [], [], max(next_probe - now, 0))
+            for sock in ready:
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except OSError:
+                    continue
+                self.offer(data, addr[0], time.perf_counter())
+
+    def offer(self, data, ip, received):
+        """Records an offer datagram from ip"""
+        if len(data) < LEGACY_OFFER.size:
+            return
+        if len(data) >= OFFER.size:
+            cookie, mtype, port, name_b, sessions, capacity, nonce = OFFER.unpack(data[:OFFER.size])
+        else:
+            # A server without load reports
+            cookie, mtype, port, name_b = LEGACY_OFFER.unpack(data[:LEGACY_OFFER.size])
+            sessions, capacity, nonce = LOAD_UNKNOWN, 0, 0
+        if cookie != MAGIC_COOKIE or mtype != OFFER_TYPE:
+            return
+        with self.changed:
+            entry = self.servers.get((ip, port))
+            if entry is None:
+                entry = self.servers[(ip, port)] = server_entry(ip, port, name_b.decode(errors='ignore').strip('\x00'))
+            entry.seen = time.monotonic()
+            entry.sessions = sessions
+            entry.capacity = capacity
+            sent = self.pending.get(nonce) if nonce else None
+            if sent is not None:
+                entry.rtt = received - sent
+            self.changed.notify_all()
+
+    def live(self):
+        """Servers heard from within the TTL, expired ones are dropped"""
+        with self.changed:
+            cutoff = time.monotonic() - self.ttl
+            for key in [k for k, e in self.servers.items() if e.seen < cutoff]:
+                del self.servers[key]
+            return list(self.servers.values())
+
+    def choose(self, policy="rtt", timeout=None):
+        """
+        The best live server, by lowest RTT or lowest load (the other breaks ties).
+        Only waits (probing right away) when no server is known, None after timeout.
+        """
+        if policy == "load":
+            key = lambda e: (e.load(), e.rtt if e.rtt is not None else float("inf"))
+        else:
+            key = lambda e: (e.rtt if e.rtt is not None else float("inf"), e.load())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.changed:
+            servers = self.live()
+            while not servers:
+                left = self.probe_interval if deadline is None else min(deadline - time.monotonic(), self.probe_interval)
+                if left <= 0:
+                    return None
+                self.probe()
+                # Short waits, so Ctrl+C gets through and a lost probe is sent again
+                self.changed.wait(left)
+                servers = self.live()
+        return min(servers, key=key)
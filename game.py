@@ -1,3 +1,5 @@
+from rules import MSG_TIE, MSG_WIN
+
 class game:
     def __init__(self, dealer, player, deck):
         self.dealer = dealer
@@ -5,8 +7,9 @@ class game:
         self.deck = deck
 
     def start_round(self):
-        self.deck.reset()
-        self.deck.shuffle()
+        if self.deck.needs_shuffle():
+            self.deck.reset()
+            self.deck.shuffle()
         self.player.reset_hand()
         self.dealer.reset_hand()
         
@@ -40,16 +43,20 @@ class game:
         print(f"{self.dealer.name}'s final score is {self.dealer.calculate_hand_value()}.")
     
     def determine_winner(self):
+        code, units = self.dealer.rules.outcome(self.player.total, len(self.player.hand),
+                                                self.dealer.total, len(self.dealer.hand))
         if self.player.is_busted():
             return f"{self.dealer.name} wins! {self.player.name} busted."
+        elif code == MSG_WIN and units > 1:
+            return f"Blackjack! {self.player.name} wins {units:g} to 1."
+        elif code == MSG_TIE:
+            return "It's a tie!"
+        elif code != MSG_WIN:
+            return f"{self.dealer.name} wins with a score of {self.dealer.calculate_hand_value()} against {self.player.calculate_hand_value()}!"
         elif self.dealer.is_busted():
             return f"{self.player.name} wins! {self.dealer.name} busted."
-        elif self.player.calculate_hand_value() > self.dealer.calculate_hand_value():
-            return f"{self.player.name} wins with a score of {self.player.calculate_hand_value()} against {self.dealer.calculate_hand_value()}!"
-        elif self.player.calculate_hand_value() < self.dealer.calculate_hand_value():
-            return f"{self.dealer.name} wins with a score of {self.dealer.calculate_hand_value()} against {self.player.calculate_hand_value()}!"
         else:
-            return "It's a tie!"
+            return f"{self.player.name} wins with a score of {self.player.calculate_hand_value()} against {self.dealer.calculate_hand_value()}!"
         
     def play_game(self):
         self.start_round()
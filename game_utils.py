@@ -1,4 +1,7 @@
 import random
+import struct
+from array import array
+from rules import DEFAULT_RULES, MSG_TIE, MSG_WIN
 
 # --- Colors Helper ---
 class bcolors:
@@ -12,34 +15,91 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+# --- Network Helper ---
+def recv_exact(sock, n):
+    """
+    Reads exactly n bytes from a TCP socket (a single recv may return fewer).
+    Returns a shorter result only if the peer closed the connection.
+    """
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+def raise_fd_limit():
+    """Lift the soft open-files limit to the hard limit so one process can hold many sessions"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+# --- Cards ---
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace']
+# Protocol numbers: rank 1-13 (Ace = 1), suit 1-4
+NET_RANKS = {'Ace': 1, 'Jack': 11, 'Queen': 12, 'King': 13}
+
 class card:
-    def __init__(self, rank, suit):
+    """
+    A playing card. The 52 cards are built once (CARDS, indexed by card id 0-51)
+    and card(rank, suit) hands back the shared instance, so dealing allocates nothing.
+    The blackjack value, the protocol rank/suit and the printed label are precomputed.
+    """
+    __slots__ = ('id', 'rank', 'suit', 'points', 'net_rank', 'net_suit', 'wire', 'label')
+
+    def __new__(cls, rank, suit):
+        known = CARD_INDEX.get((rank, suit))
+        if known is not None:
+            return known
+        return cls._build(rank, suit, -1)
+
+    @classmethod
+    def _build(cls, rank, suit, card_id):
+        self = object.__new__(cls)
+        self.id = card_id
         self.rank = rank
         self.suit = suit
-        
-    def __repr__(self):
+        if rank in ['Jack', 'Queen', 'King']:
+            self.points = 10
+        elif rank == 'Ace':
+            self.points = 11
+        else:
+            self.points = int(rank)
+        self.net_rank = NET_RANKS.get(rank) or (int(rank) if str(rank).isdigit() else 0)
+        self.net_suit = SUITS.index(suit) + 1 if suit in SUITS else 1
+        # Rank (2), Suit (1) as they appear in a payload packet
+        self.wire = struct.pack("!HB", self.net_rank, self.net_suit)
+
         # Colorize suits: Hearts/Diamonds = Red, Spades/Clubs = Cyan
-        if self.suit in ['Hearts', 'Diamonds']:
+        if suit in ['Hearts', 'Diamonds']:
             color = bcolors.FAIL
         else:
             color = bcolors.CYAN
-            
         # Example: "10 of [Red]Hearts[Reset]"
-        return f"{self.rank} of {color}{self.suit}{bcolors.ENDC}"
+        self.label = f"{rank} of {color}{suit}{bcolors.ENDC}"
+        return self
+        
+    def __repr__(self):
+        return self.label
     
     def value(self):
-        if self.rank in ['Jack', 'Queen', 'King']:
-            return 10
-        elif self.rank == 'Ace':
-            return 11
-        else:
-            return int(self.rank)
+        return self.points
+
+CARD_INDEX = {}
+CARDS = [card._build(rank, suit, i) for i, (suit, rank) in enumerate((s, r) for s in SUITS for r in RANKS)]
+CARD_INDEX.update(((c.rank, c.suit), c) for c in CARDS)
+# Lookup by protocol numbers, e.g. NET_CARDS[(1, 4)] is the Ace of Spades
+NET_CARDS = {(c.net_rank, c.net_suit): c for c in CARDS}
 
 class deck:
     def __init__(self):
-        suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-        ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace']
-        self.cards = [card(rank, suit) for suit in suits for rank in ranks]
+        self.cards = list(CARDS)
 
     def __repr__(self):
         return f"Deck of {len(self.cards)} cards"
@@ -65,20 +125,111 @@ class deck:
     def add_card(self, card):
         self.cards.append(card)
 
+    def needs_shuffle(self):
+        return True # A single deck is rebuilt and shuffled every round
+
+def round_cards(decks=1, players=1):
+    """
+    Most cards one round can take from a shoe of `decks` decks, whatever anyone decides.
+    A player's hand ends at the latest on the card that takes it past 21, so the cards
+    before it add up to at most 21 (Aces as 1); the dealer's cards before the last add up
+    to at most 16. Filling those budgets with the lowest cards of the shoe gives the bound
+    (17 cards from one deck, 32 from six).
+    """
+    budget = 21 * players + 16
+    count = 0
+    for value in range(1, 11):
+        available = (16 if value == 10 else 4) * decks
+        take = min(available, budget // value)
+        count += take
+        budget -= take * value
+        if take < available:
+            break
+    return count + players + 1 # Every hand's last card
+
+def cut_card(cards, penetration):
+    """Cards dealt from a shoe of `cards` before it is reshuffled, leaving a whole round behind the cut"""
+    return max(0, min(int(cards * penetration), cards - round_cards(cards // len(CARDS))))
+
+class shoe:
+    """
+    A shoe of several decks dealt from the shared CARDS table.
+    The shoe is an array of card ids shuffled in place; the cards are never rebuilt.
+    Once the cut card is reached (penetration = share of the shoe dealt before
+    reshuffling, 0 reshuffles every round) the next round starts a fresh shuffle.
+    A shuffler (e.g. shuffler.shoe_pool) hands out ready shuffled orders instead.
+    A new shoe is dealt out, the first round shuffles it: an order taken here would be
+    thrown away by that round's shuffle.
+    """
+    def __init__(self, decks=6, penetration=0.75, shuffler=None):
+        self.decks = decks
+        self.shuffler = shuffler
+        self.order = array('B', range(len(CARDS))) * decks
+        self.cut = cut_card(len(self.order), penetration)
+        self.pos = len(self.order)
+
+    def __repr__(self):
+        return f"Shoe of {self.decks} decks, {self.count()} cards left"
+
+    def shuffle(self):
+        if self.shuffler is not None:
+            self.order = self.shuffler.take() # A new order, nothing to shuffle here
+        else:
+            random.shuffle(self.order)
+        self.pos = 0
+
+    def deal(self):
+        if self.pos >= len(self.order):
+            return None
+        c = CARDS[self.order[self.pos]]
+        self.pos += 1
+        return c
+
+    def reset(self):
+        self.pos = 0 # Every card goes back in, shuffle() decides the new order
+
+    def count(self):
+        return len(self.order) - self.pos
+
+    def is_empty(self):
+        return self.pos >= len(self.order)
+
+    def peek(self):
+        return None if self.is_empty() else CARDS[self.order[self.pos]]
+
+    def needs_shuffle(self):
+        return self.pos >= self.cut
+
 class player:
+    """
+    A hand of cards. The hand value is kept up to date as cards arrive:
+    total is the best value (Aces count 11 unless that busts), aces the number
+    of Aces held and soft is True while an Ace is still counted as 11.
+    """
     def __init__(self, name):
         self.name = name
-        self.hand = []
+        self.reset_hand()
 
     def get_info(self):
-        return f"Player: {self.name}, Score: {self.calculate_hand_value()}, Cards: {self.show_hand()}"
+        return f"Player: {self.name}, Score: {self.total}, Cards: {self.show_hand()}"
     
     def receive_card(self, card):
         self.hand.append(card)
+        val = card.value()
+        total = self.total + val
+        soft_aces = self.soft
+        if val == 11:
+            self.aces += 1
+            soft_aces += 1
+        # Count Aces as 1 instead of 11 while that keeps the hand from busting
+        while total > 21 and soft_aces:
+            total -= 10
+            soft_aces -= 1
+        self.total = total
+        self.soft = soft_aces > 0
     
     def is_busted(self):
-        score = self.calculate_hand_value()
-        return score > 21
+        return self.total > 21
     
     def get_total_cards(self):
         return len(self.hand)
@@ -88,23 +239,18 @@ class player:
     
     def reset_hand(self):
         self.hand = []
+        self.total = 0
+        self.aces = 0
+        self.soft = False
     
     def calculate_hand_value(self):
-        total = 0
-        aces = 0
-        for card in self.hand:
-            val = card.value()
-            total += val
-            if card.rank == 'Ace':
-                aces += 1
-        while total > 21 and aces:
-            total -= 10
-            aces -= 1
-        return total
+        return self.total
 
 class dealer(player):
-    def __init__(self, name="Dealer"):
+    def __init__(self, name="Dealer", rules=DEFAULT_RULES):
         super().__init__(name)
+        self.rules = rules
+        self.hits = rules.dealer_hits # [soft][total], H17 or S17 is one lookup either way
 
     def show_initial_card(self):
         if self.hand:
@@ -112,7 +258,7 @@ class dealer(player):
         return f"{self.name} has no cards to show."
     
     def should_hit(self):
-        return self.calculate_hand_value() < 17
+        return self.hits[self.soft][self.total]
     
     def play_turn(self, deck):
         while self.should_hit():
@@ -129,8 +275,9 @@ class game:
         self.deck = deck
 
     def start_round(self):
-        self.deck.reset()
-        self.deck.shuffle()
+        if self.deck.needs_shuffle():
+            self.deck.reset()
+            self.deck.shuffle()
         self.player.reset_hand()
         self.dealer.reset_hand()
         
@@ -164,16 +311,20 @@ class game:
         print(f"{self.dealer.name}'s final score is {self.dealer.calculate_hand_value()}.")
     
     def determine_winner(self):
+        code, units = self.dealer.rules.outcome(self.player.total, len(self.player.hand),
+                                                self.dealer.total, len(self.dealer.hand))
         if self.player.is_busted():
             return f"{bcolors.FAIL}{self.dealer.name} wins! {self.player.name} busted.{bcolors.ENDC}"
+        elif code == MSG_WIN and units > 1:
+            return f"{bcolors.GREEN}Blackjack! {self.player.name} wins {units:g} to 1.{bcolors.ENDC}"
+        elif code == MSG_TIE:
+            return f"{bcolors.WARNING}It's a tie!{bcolors.ENDC}"
+        elif code != MSG_WIN:
+            return f"{bcolors.FAIL}{self.dealer.name} wins with {self.dealer.calculate_hand_value()} vs {self.player.calculate_hand_value()}!{bcolors.ENDC}"
         elif self.dealer.is_busted():
             return f"{bcolors.GREEN}{self.player.name} wins! {self.dealer.name} busted.{bcolors.ENDC}"
-        elif self.player.calculate_hand_value() > self.dealer.calculate_hand_value():
-            return f"{bcolors.GREEN}{self.player.name} wins with {self.player.calculate_hand_value()} vs {self.dealer.calculate_hand_value()}!{bcolors.ENDC}"
-        elif self.player.calculate_hand_value() < self.dealer.calculate_hand_value():
-            return f"{bcolors.FAIL}{self.dealer.name} wins with {self.dealer.calculate_hand_value()} vs {self.player.calculate_hand_value()}!{bcolors.ENDC}"
         else:
-            return f"{bcolors.WARNING}It's a tie!{bcolors.ENDC}"
+            return f"{bcolors.GREEN}{self.player.name} wins with {self.player.calculate_hand_value()} vs {self.dealer.calculate_hand_value()}!{bcolors.ENDC}"
         
     def play_game(self):
         self.start_round()
@@ -0,0 +1,264 @@
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from game_utils import *
+from simulator import add_card
+from rules import DEFAULT_RULES, DEFAULT_SPEC, HAND_ACTIONS, HAND_BUST, HAND_NATURAL, MSG_LOSS, parse_rules, rule_set
+from strategy import basic_strategy
+
+# --- Binary Hand Log ---
+# Fixed-width records of finished rounds, for auditing and offline analysis.
+# A card is stored exactly as it travels in a payload packet: Rank (2, 1-13), Suit (1, 1-4),
+# big endian, i.e. card.wire. A record is
+#   Result (1), Action (1, see rules.HAND_ACTIONS), Player cards (1), Dealer cards (1),
+#   PLAYER_SLOTS cards, DEALER_SLOTS cards (unused slots are zero)
+# after an 8 byte file header, whose flags hold the rules that decide the results (H17).
+# Fixed width means the reader can map the file and view it
+# as a NumPy structured array without parsing or copying anything, and verify every
+# round with column-wise array operations instead of a Python object per card.
+
+MAGIC = b"BJHL"
+VERSION = 2
+PLAYER_SLOTS = 16  # More than any single deck hand, a longer (multi-deck) hand can't be logged
+DEALER_SLOTS = 12
+FILE_HEADER = struct.Struct("!4sBBBB")  # Magic, Version, Player slots, Dealer slots, Flags
+RECORD_HEADER = struct.Struct("!BBBB")  # Result, Action, Player cards, Dealer cards
+FLUSH_BYTES = 1 << 16
+FLAG_H17 = 0x1
+
+ACTION_DOUBLE = HAND_ACTIONS["D"]
+ACTION_SURRENDER = HAND_ACTIONS["R"]
+
+CARD_DTYPE = np.dtype([('rank', '>u2'), ('suit', 'u1')])
+RECORD_DTYPE = np.dtype([
+    ('result', 'u1'),
+    ('action', 'u1'),
+    ('n_player', 'u1'),
+    ('n_dealer', 'u1'),
+    ('player', CARD_DTYPE, (PLAYER_SLOTS,)),
+    ('dealer', CARD_DTYPE, (DEALER_SLOTS,)),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+EMPTY_SLOT = bytes(CARD_DTYPE.itemsize)
+
+def encode_round(player_cards, dealer_cards, result, action=0):
+    """One record, from the cards in the order they were dealt"""
+    if len(player_cards) > PLAYER_SLOTS or len(dealer_cards) > DEALER_SLOTS:
+        raise ValueError(f"Round too long for a record: {len(player_cards)} + {len(dealer_cards)} cards")
+    return b"".join([
+        RECORD_HEADER.pack(result, action, len(player_cards), len(dealer_cards)),
+        *[c.wire for c in player_cards], EMPTY_SLOT * (PLAYER_SLOTS - len(player_cards)),
+        *[c.wire for c in dealer_cards], EMPTY_SLOT * (DEALER_SLOTS - len(dealer_cards)),
+    ])
+
+class hand_log_writer:
+    """
+    Appends records to a hand log, in FLUSH_BYTES writes. Safe to share between threads.
+    A round with more cards than a record holds is skipped, never raised to the game.
+    """
+    def __init__(self, path, rules=DEFAULT_RULES, on_skip=None):
+        flags = FLAG_H17 if rules.hit_soft_17 else 0
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, PLAYER_SLOTS, DEALER_SLOTS, flags))
+        elif check_header(path) != flags:
+            self.file.close()
+            raise ValueError(f"{path} was logged under other rules")
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.rounds = 0
+        self.skipped = 0
+        self.on_skip = on_skip # Called when a round is too long to log, e.g. a metrics counter
+
+    def write(self, player_cards, dealer_cards, result, action=0):
+        if len(player_cards) > PLAYER_SLOTS or len(dealer_cards) > DEALER_SLOTS:
+            # Only possible from a multi-deck shoe; a failed log record must not end a live game
+            with self.lock:
+                self.skipped += 1
+            if self.on_skip:
+                self.on_skip()
+            return
+        record = encode_round(player_cards, dealer_cards, result, action)
+        with self.lock:
+            self.buffer += record
+            self.rounds += 1
+            if len(self.buffer) >= FLUSH_BYTES:
+                self.flush()
+
+    def flush(self):
+        # Whole records only, so a crash can't leave half a record behind a later one
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer.clear()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.file.close()
+
+def check_header(path):
+    """The log's rule flags, after checking it is a hand log this version can read"""
+    with open(path, "rb") as f:
+        magic, version, p_slots, d_slots, flags = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC or version != VERSION or (p_slots, d_slots) != (PLAYER_SLOTS, DEALER_SLOTS):
+        raise ValueError(f"{path} is not a version {VERSION} hand log")
+    return flags
+
+def log_rules(path):
+    """The rules that decide the results in a log"""
+    return rule_set(hit_soft_17=bool(check_header(path) & FLAG_H17))
+
+# --- Reading ---
+
+def open_log(path):
+    """
+    The log as a read-only structured array over a memory map of the file (no copy).
+    A partly written last record is left out.
+    """
+    check_header(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= FILE_HEADER.size:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    count = (size - FILE_HEADER.size) // RECORD_SIZE
+    return np.frombuffer(mm, dtype=RECORD_DTYPE, count=count, offset=FILE_HEADER.size)
+
+def iter_rounds(records):
+    """(result, player cards, dealer cards) per round, as the shared card instances"""
+    for rec in records:
+        player_cards = [NET_CARDS[(int(c['rank']), int(c['suit']))] for c in rec['player'][:rec['n_player']]]
+        dealer_cards = [NET_CARDS[(int(c['rank']), int(c['suit']))] for c in rec['dealer'][:rec['n_dealer']]]
+        yield int(rec['result']), player_cards, dealer_cards
+
+def card_values(ranks):
+    """Blackjack values of wire ranks (Ace = 11, pictures = 10, empty slot = 0)"""
+    values = np.minimum(ranks, 10).astype(np.int8)
+    values[ranks == 1] = 11
+    return values
+
+def verify(records, rules=DEFAULT_RULES):
+    """
+    Replays every round with the game's rules, column by column over all records.
+    Returns a boolean array marking the rounds whose cards or result break them:
+    cards must be real cards, the player only draws while not busted, a doubled hand
+    takes exactly one card and a surrendered one none, the dealer only plays if the
+    player neither busted nor surrendered and then draws exactly as `rules` say,
+    and the result must follow from the final hands (naturals included).
+    """
+    n = len(records)
+    bad = np.zeros(n, dtype=bool)
+    n_player = records['n_player'].astype(np.intp)
+    n_dealer = records['n_dealer'].astype(np.intp)
+    action = records['action']
+    result = records['result']
+    bad |= (n_player < 2) | (n_player > PLAYER_SLOTS) | (n_dealer < 2) | (n_dealer > DEALER_SLOTS)
+    bad |= (action != 0) & (action != ACTION_DOUBLE) & (action != ACTION_SURRENDER)
+    dealer_hits = np.array(rules.dealer_hits)
+    settle = np.array(rules.settle, dtype=np.uint8)
+
+    def play(cards, counts, slots):
+        """Final totals and softness, and the hand before each card was added"""
+        ranks = cards['rank']
+        suits = cards['suit']
+        used = np.arange(slots) < counts[:, None]
+        # Used slots hold real cards, unused ones are empty
+        bad_cards = (used & ((ranks < 1) | (ranks > 13) | (suits < 1) | (suits > 4))).any(axis=1)
+        bad_cards |= (~used & ((ranks != 0) | (suits != 0))).any(axis=1)
+        values = card_values(ranks)
+        total = np.zeros(n, dtype=np.int16)
+        soft = np.zeros(n, dtype=np.int8)
+        before = []
+        for j in range(slots):
+            before.append((total.copy(), soft.copy()))
+            add_card(total, soft, np.where(used[:, j], values[:, j], 0))
+        return total, soft, bad_cards, before
+
+    p_total, _, p_bad, p_before = play(records['player'], n_player, PLAYER_SLOTS)
+    d_total, d_soft, d_bad, d_before = play(records['dealer'], n_dealer, DEALER_SLOTS)
+    bad |= p_bad | d_bad
+
+    # A hit is only dealt to a hand that isn't busted
+    for j in range(2, PLAYER_SLOTS):
+        bad |= (n_player > j) & (p_before[j][0] > 21)
+    surrendered = action == ACTION_SURRENDER
+    bad |= (action == ACTION_DOUBLE) & (n_player != 3)
+    bad |= surrendered & ((n_player != 2) | (result != MSG_LOSS))
+
+    p_bust = p_total > 21
+    # A busted or surrendered player ends the round: the dealer never draws
+    played = ~(p_bust | surrendered)
+    bad |= ~played & (n_dealer != 2)
+    # Otherwise the dealer draws exactly while the rules say hit
+    top = dealer_hits.shape[1] - 1 # Only reached by corrupt records, every real total fits
+    for j in range(2, DEALER_SLOTS):
+        total, soft = d_before[j]
+        bad |= played & (n_dealer > j) & ~dealer_hits[soft, np.minimum(total, top)]
+    bad |= played & dealer_hits[d_soft, np.minimum(d_total, top)]
+
+    p_slot = np.where(p_bust, HAND_BUST, np.where((p_total == 21) & (n_player == 2), HAND_NATURAL, p_total))
+    d_slot = np.where(d_total > 21, HAND_BUST, np.where((d_total == 21) & (n_dealer == 2), HAND_NATURAL, d_total))
+    expected = settle[p_slot, d_slot]
+    bad |= played & (result != expected)
+    bad |= p_bust & (result != MSG_LOSS)
+    return bad
+
+# --- Recording rounds without a server ---
+
+def record_rounds(path, rounds, decide=basic_strategy, rules=DEFAULT_RULES):
+    """Plays rounds with the game classes and logs them, like the server with --hand-log"""
+    writer = hand_log_writer(path, rules)
+    p = player("Log")
+    d = dealer(rules=rules)
+    g = game(d, p, shoe(rules.decks, 0.0))
+    for _ in range(rounds):
+        g.start_round()
+        up = d.hand[0].value()
+        while not p.is_busted() and decide(p.total, p.soft, up):
+            p.receive_card(g.deck.deal())
+        if not p.is_busted():
+            d.play_turn(g.deck)
+        result, _ = rules.outcome(p.total, len(p.hand), d.total, len(d.hand))
+        writer.write(p.hand, d.hand, result)
+    writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary hand logs: record, inspect and verify")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="play rounds locally and append them to a log")
+    rec.add_argument("path")
+    rec.add_argument("--rounds", type=int, default=1_000_000)
+    rec.add_argument("--rules", default=DEFAULT_SPEC, help=f"rule set spec (default: {DEFAULT_SPEC})")
+    rec.add_argument("--decks", type=int, default=None, help="shoe size, overrides the rule set's")
+    ver = sub.add_parser("verify", help="replay every round of a log against the rules")
+    ver.add_argument("path")
+    show = sub.add_parser("show", help="print the last rounds of a log")
+    show.add_argument("path")
+    show.add_argument("--last", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        start = time.perf_counter()
+        record_rounds(args.path, args.rounds, rules=parse_rules(args.rules, args.decks))
+        print(f"Logged {args.rounds:,} rounds in {time.perf_counter() - start:.2f}s")
+    elif args.command == "verify":
+        start = time.perf_counter()
+        records = open_log(args.path)
+        bad = verify(records, log_rules(args.path))
+        elapsed = time.perf_counter() - start
+        color = bcolors.FAIL if bad.any() else bcolors.GREEN
+        print(f"{color}{len(records):,} rounds, {int(bad.sum())} break the rules{bcolors.ENDC} "
+              f"({len(records) / max(elapsed, 1e-9):,.0f} rounds/s)")
+        for i in np.flatnonzero(bad)[:10]:
+            print(f"  record {i}: {records[i]}")
+    else:
+        records = open_log(args.path)
+        for result, player_cards, dealer_cards in iter_rounds(records[-args.last:]):
+            print(f"{player_cards} vs {dealer_cards}: {result}")
+
+if __name__ == "__main__":
+    main()
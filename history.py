@@ -0,0 +1,160 @@
+import argparse
+import sqlite3
+import threading
+import time
+from collections import deque
+from game_utils import *
+
+# --- Game History Store ---
+# Every finished round goes to SQLite: team, the cards dealt, the player's decisions,
+# the dealer's sequence and the result code. Sessions only append a tuple to a queue;
+# a writer thread inserts whatever is pending in one transaction (WAL journal, so the
+# queries below can read while rounds are written, and several worker processes can
+# share one file).
+#
+# Cards are stored as one byte per card (the card id, see CARDS), decisions as a
+# string of 'H' and 'S', ending in 'D' or 'R' for a double or a surrender. Two
+# covering indexes answer the analytics without a table scan: (team, result) for win
+# rates per team and (upcard, result) for outcomes per upcard.
+
+HISTORY_CAPACITY = 100_000  # Rounds waiting for the writer before new ones are dropped
+BATCH_SIZE = 2_000          # Rounds per transaction
+FLUSH_INTERVAL = 0.5        # Seconds a round can wait for a batch to fill
+
+RESULT_NAMES = {0x3: "win", 0x2: "loss", 0x1: "tie"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    played REAL NOT NULL,
+    team TEXT NOT NULL,
+    upcard INTEGER NOT NULL,
+    player_cards BLOB NOT NULL,
+    decisions TEXT NOT NULL,
+    dealer_cards BLOB NOT NULL,
+    result INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_team ON rounds (team, result);
+CREATE INDEX IF NOT EXISTS rounds_upcard ON rounds (upcard, result);
+"""
+
+INSERT = ("INSERT INTO rounds (played, team, upcard, player_cards, decisions, dealer_cards, result) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+def open_db(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent, a crash can only lose the last batches
+    conn.executescript(SCHEMA)
+    return conn
+
+def encode_cards(cards):
+    return bytes(c.id for c in cards)
+
+def decode_cards(blob):
+    return [CARDS[i] for i in blob]
+
+class history_store:
+    """
+    Batched round recorder. record() never touches the database, the writer thread does.
+    """
+    def __init__(self, path, capacity=HISTORY_CAPACITY, on_drop=None):
+        self.path = path
+        self.capacity = capacity
+        self.on_drop = on_drop # Called with the number of rounds dropped, e.g. a metrics counter
+        self.queue = deque()
+        self.wakeup = threading.Event()
+        self.dropped = 0
+        self.written = 0
+        self.running = True
+        # Create the schema up front, so a bad path fails at startup and not in the writer
+        open_db(path).close()
+        self.thread = threading.Thread(target=self.writer, name="history-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, team, player_cards, decisions, dealer_cards, result):
+        """Queues a finished round. dealer_cards starts with the upcard."""
+        if len(self.queue) >= self.capacity:
+            self.dropped += 1
+            if self.on_drop:
+                self.on_drop(1)
+            return
+        # deque.append is atomic, no lock needed on the session's path
+        self.queue.append((time.time(), team, dealer_cards[0].value(), encode_cards(player_cards),
+                           decisions, encode_cards(dealer_cards), result))
+        if len(self.queue) >= BATCH_SIZE:
+            self.wakeup.set()
+
+    def writer(self):
+        conn = open_db(self.path)
+        try:
+            while self.running:
+                self.wakeup.wait(FLUSH_INTERVAL)
+                self.wakeup.clear()
+                self.flush(conn)
+            self.flush(conn)
+        finally:
+            conn.close()
+
+    def flush(self, conn):
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(len(self.queue), BATCH_SIZE))]
+            try:
+                with conn:
+                    conn.executemany(INSERT, batch)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                print(f"{bcolors.FAIL}History write failed, {len(batch)} rounds lost: {e}{bcolors.ENDC}")
+
+    def close(self):
+        """Stops the writer after everything queued is written"""
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+
+# --- Queries ---
+
+def team_win_rates(conn, team=None):
+    """[(team, rounds, wins, losses, ties)], for one team or all of them"""
+    sql = ("SELECT team, COUNT(*), SUM(result = 3), SUM(result = 2), SUM(result = 1) "
+           "FROM rounds {} GROUP BY team ORDER BY team")
+    if team is None:
+        return conn.execute(sql.format("")).fetchall()
+    return conn.execute(sql.format("WHERE team = ?"), (team,)).fetchall()
+
+def upcard_outcomes(conn):
+    """[(upcard value, rounds, wins, losses, ties)], Ace = 11"""
+    return conn.execute(
+        "SELECT upcard, COUNT(*), SUM(result = 3), SUM(result = 2), SUM(result = 1) "
+        "FROM rounds GROUP BY upcard ORDER BY upcard").fetchall()
+
+def recent_rounds(conn, team, limit=10):
+    """The team's last rounds as (played, player cards, decisions, dealer cards, result)"""
+    rows = conn.execute(
+        "SELECT played, player_cards, decisions, dealer_cards, result FROM rounds "
+        "WHERE team = ? ORDER BY id DESC LIMIT ?", (team, limit)).fetchall()
+    return [(played, decode_cards(p), d, decode_cards(dl), result) for played, p, d, dl, result in rows]
+
+def print_table(title, rows):
+    print(f"{bcolors.HEADER}{title}{bcolors.ENDC}")
+    print(f"  {'':<20}{'rounds':>10}{'win':>9}{'loss':>9}{'tie':>9}")
+    for key, n, wins, losses, ties in rows:
+        print(f"  {str(key):<20}{n:>10}{wins / n:>9.2%}{losses / n:>9.2%}{ties / n:>9.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Game history queries")
+    parser.add_argument("db", help="history database written by server.py --history")
+    parser.add_argument("--team", help="only this team, and show its last rounds")
+    args = parser.parse_args()
+
+    conn = open_db(args.db)
+    print_table("Win rate by team", team_win_rates(conn, args.team))
+    print_table("Outcome by dealer upcard", upcard_outcomes(conn))
+    if args.team:
+        print(f"{bcolors.HEADER}Last rounds of {args.team}{bcolors.ENDC}")
+        for played, p, decisions, d, result in recent_rounds(conn, args.team):
+            print(f"  {time.strftime('%H:%M:%S', time.localtime(played))} {p} {decisions or '-'} "
+                  f"vs {d}: {RESULT_NAMES.get(result, result)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from game_utils import bcolors, raise_fd_limit
+import loadgen
+
+# --- Load Test for server.py ---
+# Starts the server in each mode as a subprocess on a private port, then:
+#   1. holds N idle sessions open and reports the server's memory/thread cost
+#   2. plays M concurrent sessions (loadgen) and reports reply latency (request or move to the
+#      first packet answering it) and rounds per second (with --batch, through the batch
+#      extension with a strategy table, where only the request is answered)
+
+HOST = "127.0.0.1"
+
+def proc_status(pid):
+    """Reads VmRSS (kB) and thread count of a process from /proc"""
+    rss_kb, threads = 0, 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss_kb, threads
+
+def start_server(mode, port, *args):
+    """server.py in a subprocess (extra command line args), once it accepts connections"""
+    proc = subprocess.Popen(
+        [sys.executable, "server.py", "--mode", mode, "--port", str(port), *args],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Wait until the server accepts connections
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"server ({mode}) did not start on port {port}")
+
+async def hold_idle(port, sessions):
+    """Opens `sessions` connections that never send a request, so each one parks a server session"""
+    conns = []
+    for _ in range(sessions):
+        try:
+            conns.append(await asyncio.open_connection(HOST, port))
+        except OSError:
+            break
+    return conns
+
+async def run_mode(mode, port, idle, active, rounds, batch=False):
+    proc = start_server(mode, port, "--metrics-port", "0") # The default port may be another server's
+    try:
+        base_rss, base_threads = proc_status(proc.pid)
+
+        conns = await hold_idle(port, idle)
+        await asyncio.sleep(1.0)
+        rss, threads = proc_status(proc.pid)
+        held = len(conns)
+        for _, w in conns:
+            w.close()
+
+        stats, elapsed = await loadgen.run_load(
+            HOST, port, active, rounds, loadgen.POLICIES['dealer'], concurrency=active, batch=batch)
+    finally:
+        proc.kill()
+        proc.wait()
+
+    per_session_kb = (rss - base_rss) / held if held else 0
+    latency = stats.reply_latency
+    print(f"{bcolors.HEADER}{mode}{bcolors.ENDC}")
+    print(f"  idle sessions held : {held} (server RSS {rss / 1024:.1f} MB, "
+          f"{per_session_kb:.1f} kB/session, {threads} threads)")
+    print(f"  active sessions    : {active} x {rounds} rounds, {stats.rounds} rounds in {elapsed:.2f}s")
+    print(f"  rounds/s           : {stats.rounds / elapsed:.1f} total, "
+          f"{stats.rounds / elapsed / max(active, 1):.2f} per connection")
+    print(f"  reply latency      : p50 {latency.percentile(50) * 1000:.1f} ms, "
+          f"p99 {latency.percentile(99) * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the blackjack server")
+    parser.add_argument("--mode", choices=["threaded", "asyncio", "both"], default="both")
+    parser.add_argument("--port", type=int, default=15555)
+    parser.add_argument("--idle", type=int, default=2000, help="idle sessions to hold open")
+    parser.add_argument("--active", type=int, default=200, help="concurrent playing sessions")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per playing session")
+    parser.add_argument("--batch", action="store_true", help="play through the batch extension with a strategy table")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    modes = ["threaded", "asyncio"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run_mode(mode, args.port, args.idle, args.active, args.rounds, args.batch))
+
+if __name__ == "__main__":
+    main()
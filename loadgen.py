@@ -0,0 +1,208 @@
+import asyncio
+import importlib
+import math
+import time
+from game_utils import *
+from strategy import basic_strategy, encode_table
+from connpool import async_connection_pool
+from protocol import (BATCH_REQUEST_TYPE, HIT, KEEPALIVE_FLAG, MAGIC_COOKIE, MSG_ONGOING, MSG_WIN, PAYLOAD_SIZE,
+                      REQUEST_TYPE, ROUND_HEADER, ROUND_HEADER_SIZE, STAND, STRATEGY_HEADER, STRATEGY_TYPE,
+                      decode_payload, pack_request)
+
+# --- Load Generator ---
+# Plays many concurrent sessions against a server on one asyncio loop, every decision
+# made by a policy, and measures connect time, rounds per second and the reply latency:
+# from sending a request or a move to the first packet the server answers it with. (The
+# gaps between the packets of one answer say nothing, the server sends them in one write.)
+# With keep-alive, sessions are requests on pooled connections instead of a connection each.
+
+TEAM_NAME = b"LoadGen"
+
+# --- Policies ---
+# A policy decides hit (True) or stand from (total, soft, dealer upcard value).
+
+POLICIES = {
+    'basic': basic_strategy,
+    'dealer': lambda total, soft, upcard: total < 17,
+    'stand': lambda total, soft, upcard: False,
+}
+
+def load_policy(name):
+    """A policy by name, or any function given as 'module:function'"""
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, func = name.partition(':')
+    return getattr(importlib.import_module(module), func)
+
+class latency_histogram:
+    """
+    Log-scale histogram: buckets grow by 5%, so percentiles are within 5% whatever the
+    sample count, and memory stays a few hundred buckets.
+    """
+    GROWTH = 1.05
+    FLOOR = 1e-6 # 1 us
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+
+    def record(self, seconds):
+        i = int(math.log(max(seconds, self.FLOOR) / self.FLOOR, self.GROWTH))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= rank:
+                return self.FLOOR * self.GROWTH ** (i + 1)
+        return 0.0
+
+    def summary(self):
+        return "  ".join(f"p{p} {self.percentile(p) * 1000:.2f} ms" for p in (50, 95, 99))
+
+class load_stats:
+    def __init__(self):
+        self.connects = 0
+        self.reused = 0
+        self.connect_errors = 0
+        self.session_errors = 0
+        self.rounds = 0
+        self.wins = 0
+        self.connect_latency = latency_histogram()
+        self.reply_latency = latency_histogram()
+
+async def play_session(host, port, rounds, decide, stats, pool=None):
+    """One session on the legacy protocol: 9-byte cards, a move per decision"""
+    reader, writer = await connect(host, port, stats, pool)
+    if reader is None:
+        return
+    done = False
+    try:
+        writer.write(request(REQUEST_TYPE, rounds, pool))
+        sent = time.perf_counter() # Of the message the server has yet to answer, None once it has
+        me = player("LoadGen")
+        for _ in range(rounds):
+            me.reset_hand()
+            cards_seen = 0
+            my_turn = True
+            while True:
+                data = await reader.readexactly(PAYLOAD_SIZE)
+                if sent is not None:
+                    stats.reply_latency.record(time.perf_counter() - sent)
+                    sent = None
+                res, c = decode_payload(data)
+                if res != MSG_ONGOING:
+                    stats.rounds += 1
+                    stats.wins += res == MSG_WIN
+                    break
+                cards_seen += 1
+                if cards_seen == 3:
+                    upcard = c.value()
+                elif my_turn and c is not None:
+                    me.receive_card(c)
+                if cards_seen >= 3 and my_turn and not me.is_busted():
+                    if decide(me.total, me.soft, upcard):
+                        writer.write(HIT)
+                    else:
+                        writer.write(STAND)
+                        my_turn = False
+                    sent = time.perf_counter()
+        done = True
+    except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+        stats.session_errors += 1
+    finally:
+        release(host, port, reader, writer, pool, done)
+
+async def play_batch_session(host, port, rounds, decide, stats, pool=None):
+    """One session on the batch extension: the policy goes to the server as a table, a frame per round"""
+    reader, writer = await connect(host, port, stats, pool)
+    if reader is None:
+        return
+    done = False
+    try:
+        writer.write(request(BATCH_REQUEST_TYPE, rounds, pool))
+        writer.write(STRATEGY_HEADER.pack(MAGIC_COOKIE, STRATEGY_TYPE, 1) + encode_table(decide))
+        sent = time.perf_counter()
+        for r in range(rounds):
+            header = await reader.readexactly(ROUND_HEADER_SIZE)
+            if r == 0:
+                # The server plays every round from the table, only the first frame answers us
+                stats.reply_latency.record(time.perf_counter() - sent)
+            _, _, res, n_player, n_dealer = ROUND_HEADER.unpack(header)
+            await reader.readexactly(3 * (n_player + n_dealer))
+            stats.rounds += 1
+            stats.wins += res == MSG_WIN
+        done = True
+    except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+        stats.session_errors += 1
+    finally:
+        release(host, port, reader, writer, pool, done)
+
+def request(mtype, rounds, pool):
+    """The request packet, asking the server to keep the connection when it is pooled"""
+    if pool is not None:
+        mtype |= KEEPALIVE_FLAG
+    return pack_request(mtype, rounds, TEAM_NAME)
+
+def release(host, port, reader, writer, pool, done):
+    """Pools a connection after a complete session, closes it otherwise"""
+    if pool is not None and done:
+        pool.put(host, port, reader, writer)
+    else:
+        writer.close()
+
+async def connect(host, port, stats, pool=None):
+    if pool is not None:
+        pooled = pool.take(host, port)
+        if pooled is not None:
+            stats.reused += 1
+            return pooled
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.connect_errors += 1
+        return None, None
+    stats.connect_latency.record(time.perf_counter() - start)
+    stats.connects += 1
+    return reader, writer
+
+async def run_load(host, port, sessions, rounds, decide, concurrency=1000, batch=False, keep_alive=False):
+    """
+    Plays `sessions` sessions of `rounds` rounds, at most `concurrency` at a time.
+    With keep_alive the sessions share at most `concurrency` connections.
+    Returns (load_stats, elapsed seconds).
+    """
+    stats = load_stats()
+    play = play_batch_session if batch else play_session
+    slots = asyncio.Semaphore(concurrency)
+    pool = async_connection_pool(max_idle=concurrency) if keep_alive else None
+
+    async def limited():
+        async with slots:
+            await play(host, port, rounds, decide, stats, pool)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    if pool is not None:
+        pool.close()
+    return stats, elapsed
+
+def report(stats, elapsed):
+    return "\n".join([
+        f"Sessions: {stats.connects} connected, {stats.reused} on a kept-alive connection, "
+        f"{stats.connect_errors} failed to connect, "
+        f"{stats.session_errors} broken",
+        f"Connections/s: {stats.connects / elapsed:.1f}",
+        f"Rounds/s: {stats.rounds / elapsed:.1f} ({stats.rounds} rounds in {elapsed:.2f}s, "
+        f"win rate {stats.wins / max(stats.rounds, 1):.2%})",
+        f"Connect latency: {stats.connect_latency.summary()}",
+        f"Reply latency: {stats.reply_latency.summary()}",
+    ])
@@ -0,0 +1,125 @@
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+# --- Asynchronous Logging Pipeline ---
+# Game threads and coroutines only append (format string, args) to a bounded queue.
+# A background thread formats the lines and writes them in batches, one write and flush
+# per batch, so a session never waits on the stdout lock, the terminal or the disk.
+#
+# Two limits protect the game when logging can't keep up:
+#   rate  - a token bucket of lines per second, lines over it are dropped at the source
+#   queue - at most `capacity` pending lines; when full, the drop policy picks the victim:
+#           "newest" drops the line being logged, "oldest" drops the oldest pending one
+# Errors skip the rate limit, but not the queue bound.
+
+LOG_CAPACITY = 10_000
+LOG_RATE = 2_000        # Lines per second, 0 = unlimited
+BATCH_SIZE = 512        # Lines per write
+FLUSH_INTERVAL = 0.05   # Seconds a line can wait for a batch to fill
+DROP_POLICIES = ("newest", "oldest")
+
+class log_pipeline:
+    def __init__(self, stream=None, capacity=LOG_CAPACITY, rate=LOG_RATE, drop="newest", on_drop=None):
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop}")
+        self.stream = stream or sys.stdout
+        self.capacity = capacity
+        self.rate = rate
+        self.drop = drop
+        self.on_drop = on_drop # Called with the number of lines dropped, e.g. a metrics counter
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.tokens = float(rate)
+        self.refilled = time.monotonic()
+        self.dropped = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.writer, name="log-writer", daemon=True)
+            self.thread.start()
+        return self
+
+    def emit(self, message, *args):
+        """Queues a line, formatted later as message % args. Never blocks on I/O."""
+        with self.lock:
+            if self.rate:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.refilled) * self.rate)
+                self.refilled = now
+                if self.tokens < 1:
+                    self.dropped += 1
+                    dropped = 1
+                else:
+                    self.tokens -= 1
+                    dropped = self.enqueue((message, args))
+            else:
+                dropped = self.enqueue((message, args))
+        if dropped and self.on_drop:
+            self.on_drop(dropped)
+
+    def error(self, message, *args, exc_info=False):
+        """An error line (plus the current traceback with exc_info), never rate limited"""
+        if exc_info:
+            message = message % args + "\n" + traceback.format_exc().rstrip()
+            args = ()
+        with self.lock:
+            dropped = self.enqueue((message, args))
+        if dropped and self.on_drop:
+            self.on_drop(dropped)
+
+    def enqueue(self, entry):
+        """Appends under the lock, returns how many lines were dropped (0 or 1)"""
+        if len(self.queue) >= self.capacity:
+            self.dropped += 1
+            if self.drop == "newest":
+                return 1
+            self.queue.popleft()
+            self.queue.append(entry)
+            return 1
+        self.queue.append(entry)
+        if len(self.queue) >= BATCH_SIZE:
+            self.wakeup.set()
+        return 0
+
+    def writer(self):
+        while self.running:
+            self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Writes every pending line, a batch at a time"""
+        while True:
+            with self.lock:
+                n = min(len(self.queue), BATCH_SIZE)
+                batch = [self.queue.popleft() for _ in range(n)]
+            if not batch:
+                return
+            lines = []
+            for message, args in batch:
+                try:
+                    lines.append(message % args if args else message)
+                except (TypeError, ValueError) as e:
+                    lines.append(f"Bad log line {message!r}: {e}")
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass # A closed or broken console must not kill the writer
+
+    def close(self):
+        """Stops the writer after it has written everything queued"""
+        if self.running:
+            self.running = False
+            self.wakeup.set()
+            self.thread.join()
+        else:
+            self.flush()
@@ -0,0 +1,150 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from game_utils import bcolors
+
+# --- Server Metrics ---
+# Counters, gauges and latency histograms kept in memory by the game server and
+# served as Prometheus plaintext on a local HTTP endpoint (GET /metrics).
+# Recording is an increment under an uncontended lock; formatting only happens on a scrape.
+
+# Seconds, upper bounds of the histogram buckets (+Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=""):
+        self.name = name
+        self.help = help_text
+        self.labels = labels # e.g. 'result="win"'
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def samples(self):
+        label = f"{{{self.labels}}}" if self.labels else ""
+        return [f"{self.name}{label} {self.value}"]
+
+class gauge(counter):
+    kind = "gauge"
+
+    def dec(self, n=1):
+        with self.lock:
+            self.value -= n
+
+class histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = ""
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.bounds, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.bounds, "+Inf"), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+class registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=""):
+        return self.add(counter(name, help_text, labels))
+
+    def gauge(self, name, help_text):
+        return self.add(gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self.add(histogram(name, help_text, buckets))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        described = set()
+        for m in self.metrics:
+            if m.name not in described:
+                described.add(m.name)
+                lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+# --- The Server's Metrics ---
+METRICS = registry()
+SESSIONS = METRICS.counter("blackjack_sessions_total", "Client sessions started")
+SESSIONS_ACTIVE = METRICS.gauge("blackjack_sessions_active", "Client sessions currently open")
+SESSIONS_REJECTED = METRICS.counter("blackjack_sessions_rejected_total", "Connections turned away while every session slot was taken")
+SESSIONS_TIMED_OUT = METRICS.counter("blackjack_sessions_timed_out_total", "Sessions closed by their deadline")
+REQUESTS_REUSED = METRICS.counter("blackjack_requests_reused_total", "Requests sent on a kept-alive connection after its first")
+ROUNDS = METRICS.counter("blackjack_rounds_total", "Rounds played to the end")
+HITS = METRICS.counter("blackjack_hits_total", "Cards dealt to players on a hit")
+BUSTS = METRICS.counter("blackjack_player_busts_total", "Rounds lost by a player bust")
+PACKETS_SENT = METRICS.counter("blackjack_packets_sent_total", "Packets sent to clients by sessions")
+SENDS = METRICS.counter("blackjack_sends_total", "Writes those packets went out in, several packets between two decisions share one")
+PLAYER_UNITS = METRICS.gauge("blackjack_player_units", "Net units won by players at 1 unit per round (the house edge is -units/rounds)")
+OUTCOMES = {
+    code: METRICS.counter("blackjack_outcomes_total", "Round results sent, by result code", f'result="{name}"')
+    for code, name in ((0x3, "win"), (0x2, "loss"), (0x1, "tie"))
+}
+HANDSHAKE = METRICS.histogram("blackjack_handshake_seconds", "From accepting a connection to a valid request")
+DECISION_WAIT = METRICS.histogram("blackjack_decision_wait_seconds", "Waiting for the client's hit/stand")
+ROUND_DURATION = METRICS.histogram("blackjack_round_duration_seconds", "From the deal to the result")
+LOG_DROPPED = METRICS.counter("blackjack_log_lines_dropped_total", "Log lines dropped by the rate limit or a full queue")
+HAND_LOG_SKIPPED = METRICS.counter("blackjack_hand_log_rounds_skipped_total", "Rounds with more cards than a hand log record holds, not logged")
+HISTORY_DROPPED = METRICS.counter("blackjack_history_rounds_dropped_total", "Rounds not recorded because the history queue was full")
+SHUFFLE_POOL_MISSES = METRICS.counter("blackjack_shuffle_pool_misses_total", "Shoes shuffled in the round because the pool was empty")
+
+class metrics_handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes are not worth a line each
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serves /metrics from a background thread. Returns None if the port can't be bound
+    (e.g. another server on the host has it): the game goes on without the endpoint.
+    """
+    try:
+        httpd = ThreadingHTTPServer((host, port), metrics_handler)
+    except OSError as e:
+        print(f"{bcolors.WARNING}Metrics not served, port {port} is unavailable: {e}{bcolors.ENDC}")
+        return None
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
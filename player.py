@@ -1,17 +1,33 @@
 class player:
+    """
+    A hand of cards. The hand value is kept up to date as cards arrive:
+    total is the best value (Aces count 11 unless that busts), aces the number
+    of Aces held and soft is True while an Ace is still counted as 11.
+    """
     def __init__(self, name):
         self.name = name
-        self.hand = []
+        self.reset_hand()
 
     def get_info(self):
-        return f"Player: {self.name}, Score: {self.calculate_hand_value()}, Cards: {self.show_hand()}"
+        return f"Player: {self.name}, Score: {self.total}, Cards: {self.show_hand()}"
     
     def receive_card(self, card):
         self.hand.append(card)
+        val = card.value()
+        total = self.total + val
+        soft_aces = self.soft
+        if val == 11:
+            self.aces += 1
+            soft_aces += 1
+        # Count Aces as 1 instead of 11 while that keeps the hand from busting
+        while total > 21 and soft_aces:
+            total -= 10
+            soft_aces -= 1
+        self.total = total
+        self.soft = soft_aces > 0
     
     def is_busted(self):
-        score = self.calculate_hand_value()
-        return score > 21
+        return self.total > 21
     
     def get_total_cards(self):
         return len(self.hand)
@@ -21,16 +37,9 @@ class player:
     
     def reset_hand(self):
         self.hand = []
+        self.total = 0
+        self.aces = 0
+        self.soft = False
     
     def calculate_hand_value(self):
-        total = 0
-        aces = 0
-        for card in self.hand:
-            val = card.value()
-            total += val
-            if card.rank == 'Ace':
-                aces += 1
-        while total > 21 and aces:
-            total -= 10
-            aces -= 1
-        return total
+        return self.total
@@ -0,0 +1,164 @@
+import struct
+from game_utils import CARDS, NET_CARDS, SUITS, card
+from rules import MSG_LOSS, MSG_TIE, MSG_WIN
+
+# --- Wire Protocol ---
+# Message types, layouts and the codec shared by the server, the client and the load
+# generator. Every layout is a precompiled struct.Struct, so no format string is parsed
+# per message:
+#   - encoding: every payload packet there can be (52 cards x 4 result codes, plus the
+#     bare results) is built once, pack_card() is a table lookup
+#   - decoding: a payload_reader receives into one preallocated buffer instead of a new
+#     bytes object per read. decode_payload() costs about what struct.unpack does (it
+#     still builds the field tuple), it checks the header and returns shared cards
+
+MAGIC_COOKIE = 0xabcddcba
+OFFER_TYPE = 0x2
+REQUEST_TYPE = 0x3
+PAYLOAD_TYPE = 0x4
+# Batch extension (legacy clients never send these types)
+BATCH_REQUEST_TYPE = 0x5
+STRATEGY_TYPE = 0x6
+ROUND_TYPE = 0x7
+KEEPALIVE_FLAG = 0x40 # Or'ed into a request type: more requests follow on the connection
+
+MSG_ONGOING = 0x0
+RESULT_CODES = (MSG_ONGOING, MSG_TIE, MSG_LOSS, MSG_WIN)
+
+REQUEST = struct.Struct("!IbB32s")      # Cookie, Type, Rounds, Team name
+MOVE = struct.Struct("!Ib5s")           # Cookie, Type, Decision
+PAYLOAD = struct.Struct("!IbBHB")       # Cookie, Type, Result, Rank, Suit
+ROUND_HEADER = struct.Struct("!IbBBB")  # Cookie, Type, Result, Player cards, Dealer cards
+STRATEGY_HEADER = struct.Struct("!IbB") # Cookie, Type, Use table (the bitmap follows)
+CARD_WIRE = struct.Struct("!HB")        # Rank, Suit, as in card.wire
+MAX_IOV = 1024                          # Buffers per vectored write (IOV_MAX on Linux)
+
+REQUEST_SIZE = REQUEST.size
+MOVE_SIZE = MOVE.size
+PAYLOAD_SIZE = PAYLOAD.size
+ROUND_HEADER_SIZE = ROUND_HEADER.size
+
+# PAYLOADS[result][card id], the complete packet
+PAYLOADS = [[PAYLOAD.pack(MAGIC_COOKIE, PAYLOAD_TYPE, code, c.net_rank, c.net_suit) for c in CARDS]
+            for code in range(MSG_WIN + 1)]
+# A result without a card (rank and suit 0)
+RESULTS = [PAYLOAD.pack(MAGIC_COOKIE, PAYLOAD_TYPE, code, 0, 0) for code in range(MSG_WIN + 1)]
+
+# The moves a client can send
+HIT = MOVE.pack(MAGIC_COOKIE, PAYLOAD_TYPE, b"Hittt")
+STAND = MOVE.pack(MAGIC_COOKIE, PAYLOAD_TYPE, b"Stand")
+DOUBLE = MOVE.pack(MAGIC_COOKIE, PAYLOAD_TYPE, b"Doubl")
+SURRENDER = MOVE.pack(MAGIC_COOKIE, PAYLOAD_TYPE, b"Surre")
+
+# Card by wire rank and suit, index rank * 8 + suit (rank 1-13, suit 1-4)
+WIRE_CARDS = [None] * (14 * 8)
+for c in CARDS:
+    WIRE_CARDS[c.net_rank * 8 + c.net_suit] = c
+del c
+
+# --- Encoding ---
+
+def pack_card(card_obj, result_code=MSG_ONGOING):
+    """The payload packet for a card"""
+    if card_obj.id >= 0:
+        return PAYLOADS[result_code][card_obj.id]
+    return PAYLOAD.pack(MAGIC_COOKIE, PAYLOAD_TYPE, result_code, card_obj.net_rank, card_obj.net_suit)
+
+def pack_result(result_code):
+    """The payload packet for just a result (Win/Loss/Tie) without a card"""
+    return RESULTS[result_code]
+
+def pack_round(result_code, player_cards, dealer_cards):
+    """A batch frame carrying several cards (and optionally the result) at once"""
+    return b''.join([ROUND_HEADER.pack(MAGIC_COOKIE, ROUND_TYPE, result_code, len(player_cards), len(dealer_cards)),
+                     *[c.wire for c in player_cards], *[c.wire for c in dealer_cards]])
+
+def pack_request(mtype, rounds, team_name):
+    """A request packet, team_name as bytes or str"""
+    if isinstance(team_name, str):
+        team_name = team_name.encode()
+    return REQUEST.pack(MAGIC_COOKIE, mtype, rounds, team_name.ljust(32, b'\x00'))
+
+# --- Decoding ---
+
+def net_to_card(rank, suit):
+    """The card with protocol numbers rank and suit, a new card only for a malformed packet"""
+    if 0 < rank < 14 and 0 < suit < 8:
+        known = WIRE_CARDS[rank * 8 + suit]
+        if known is not None:
+            return known
+    known = NET_CARDS.get((rank, suit))
+    if known is not None:
+        return known
+    rank_str = {1: 'Ace', 11: 'Jack', 12: 'Queen', 13: 'King'}.get(rank, str(rank))
+    return card(rank_str, SUITS[suit - 1] if 1 <= suit <= 4 else "Unknown")
+
+def decode_payload(buf):
+    """
+    (result, card) of a payload packet in buf (bytes or bytearray), card None if the
+    packet only carries a result. Reads buf without copying it and returns the shared
+    card instance, raises ValueError if the cookie or the type is wrong.
+    """
+    cookie, mtype, result, rank, suit = PAYLOAD.unpack_from(buf)
+    if cookie != MAGIC_COOKIE or mtype != PAYLOAD_TYPE:
+        raise ValueError("Not a payload packet")
+    if 0 < rank < 14 and 0 < suit < 8:
+        known = WIRE_CARDS[rank * 8 + suit]
+        if known is not None:
+            return result, known
+    if rank == 0 and suit == 0:
+        return result, None
+    return result, net_to_card(rank, suit)
+
+def decode_cards(buf, count, offset=0):
+    """count cards from their wire form in buf, starting at offset"""
+    return [net_to_card(buf[i] << 8 | buf[i + 1], buf[i + 2]) for i in range(offset, offset + 3 * count, 3)]
+
+def recv_into_exact(sock, view):
+    """
+    Fills the memoryview from a TCP socket. Returns the number of bytes read,
+    fewer only if the peer closed the connection.
+    """
+    got = sock.recv_into(view)
+    while 0 < got < len(view):
+        n = sock.recv_into(view[got:])
+        if not n:
+            break
+        got += n
+    return got
+
+def send_packets(sock, packets):
+    """
+    Sends a list of packets with one vectored write (sendmsg), each packet a separate
+    buffer so none is copied, and keeps going after a partial write. Returns the number
+    of writes it took, usually 1.
+    """
+    if not hasattr(sock, "sendmsg"): # No writev, e.g. Windows
+        sock.sendall(b"".join(packets))
+        return 1
+    buffers = packets
+    writes = 0
+    while buffers:
+        sent = sock.sendmsg(buffers[:MAX_IOV])
+        writes += 1
+        i = 0
+        while i < len(buffers) and sent >= len(buffers[i]):
+            sent -= len(buffers[i])
+            i += 1
+        buffers = buffers[i:]
+        if sent:
+            buffers[0] = memoryview(buffers[0])[sent:]
+    return writes
+
+class payload_reader:
+    """Reads payload packets from a socket into one reusable buffer"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = bytearray(PAYLOAD_SIZE)
+        self.view = memoryview(self.buf)
+
+    def read(self):
+        """(result, card) of the next packet, None if the server closed the connection"""
+        if recv_into_exact(self.sock, self.view) < PAYLOAD_SIZE:
+            return None
+        return decode_payload(self.buf)
@@ -0,0 +1,115 @@
+# --- Rule Sets ---
+# The table rules, compiled once into lookup tables that the dealer, the server, the
+# simulator and the strategy solver all read, so a rule never becomes a branch per card:
+#   dealer_hits[soft][total]  - does the dealer draw (H17 or S17)
+#   settle[player][dealer]    - the result code of a finished round
+#   payout[player][dealer]    - units won on a 1 unit bet (naturals pay blackjack_pays)
+#   can_double[soft][total]   - may the first two cards be doubled
+# Hands are indexed by hand_slot(): totals 0-21, 22 = bust, 23 = natural blackjack.
+#
+# A rule set is written as a spec, e.g. "h17,decks=6,bj=6:5,double=10-11,surrender".
+# Splits are not offered: the protocol carries a single hand per client.
+
+MSG_WIN = 0x3
+MSG_LOSS = 0x2
+MSG_TIE = 0x1
+
+HAND_BUST = 22
+HAND_NATURAL = 23
+HAND_SLOTS = 24
+MAX_TOTAL = 32  # Covers every total a hand can show, the highest is 31 (a hard 21 hit with a 10)
+
+DOUBLE_TOTALS = {
+    "any": None, # Any first two cards
+    "9-11": range(9, 12),
+    "10-11": range(10, 12),
+    "none": range(0),
+}
+SURRENDER_UNITS = -0.5
+# How a hand ended besides hitting and standing, by its last decision (see history/handlog)
+HAND_ACTIONS = {"D": 1, "R": 2}
+DEFAULT_SPEC = "s17,bj=3:2,double=any"
+
+def hand_slot(total, cards):
+    """Index of a finished hand in the settle/payout tables"""
+    if total > 21:
+        return HAND_BUST
+    if total == 21 and cards == 2:
+        return HAND_NATURAL
+    return total
+
+class rule_set:
+    def __init__(self, decks=1, hit_soft_17=False, blackjack_pays=1.5, double="any", surrender=False):
+        if double not in DOUBLE_TOTALS:
+            raise ValueError(f"Unknown double rule: {double}")
+        self.decks = decks
+        self.hit_soft_17 = hit_soft_17
+        self.blackjack_pays = blackjack_pays
+        self.double = double
+        self.surrender = surrender
+
+        # --- Compiled tables ---
+        self.dealer_hits = [[total < 17 or (total == 17 and soft and hit_soft_17) for total in range(MAX_TOTAL)]
+                            for soft in (False, True)]
+        self.settle = [[0] * HAND_SLOTS for _ in range(HAND_SLOTS)]
+        self.payout = [[0.0] * HAND_SLOTS for _ in range(HAND_SLOTS)]
+        for p in range(HAND_SLOTS):
+            for d in range(HAND_SLOTS):
+                if p == HAND_BUST:
+                    code, units = MSG_LOSS, -1.0 # Even if the dealer busts too
+                elif p == HAND_NATURAL:
+                    code, units = (MSG_TIE, 0.0) if d == HAND_NATURAL else (MSG_WIN, blackjack_pays)
+                elif d == HAND_NATURAL:
+                    code, units = MSG_LOSS, -1.0 # Beats a 21 of three or more cards
+                elif d == HAND_BUST or p > d:
+                    code, units = MSG_WIN, 1.0
+                elif p < d:
+                    code, units = MSG_LOSS, -1.0
+                else:
+                    code, units = MSG_TIE, 0.0
+                self.settle[p][d] = code
+                self.payout[p][d] = units
+        totals = DOUBLE_TOTALS[double]
+        self.can_double = [[totals is None or (total in totals and not soft) for total in range(MAX_TOTAL)]
+                           for soft in (False, True)]
+
+    def __repr__(self):
+        return self.spec()
+
+    def spec(self):
+        """The rule set as a spec string, parse_rules(r.spec()) gives it back"""
+        pays = {1.5: "3:2", 1.2: "6:5", 1.0: "1:1"}.get(self.blackjack_pays, str(self.blackjack_pays))
+        parts = ["h17" if self.hit_soft_17 else "s17", f"decks={self.decks}", f"bj={pays}", f"double={self.double}"]
+        if self.surrender:
+            parts.append("surrender")
+        return ",".join(parts)
+
+    def outcome(self, p_total, p_cards, d_total, d_cards):
+        """(result code, units won on a 1 unit bet) of a finished round"""
+        p = hand_slot(p_total, p_cards)
+        d = hand_slot(d_total, d_cards)
+        return self.settle[p][d], self.payout[p][d]
+
+def parse_rules(spec=DEFAULT_SPEC, decks=None):
+    """A rule_set from a spec; decks, if given, overrides the spec's"""
+    options = {}
+    for part in filter(None, (p.strip().lower() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        if name in ("s17", "h17"):
+            options["hit_soft_17"] = name == "h17"
+        elif name == "decks":
+            options["decks"] = int(value)
+        elif name == "bj":
+            num, _, den = value.partition(":")
+            options["blackjack_pays"] = float(num) / float(den or 1)
+        elif name == "double":
+            options["double"] = value
+        elif name in ("surrender", "no-surrender"):
+            options["surrender"] = name == "surrender"
+        else:
+            raise ValueError(f"Unknown rule: {part}")
+    if decks is not None:
+        options["decks"] = decks
+    return rule_set(**options)
+
+DEFAULT_RULES = parse_rules()
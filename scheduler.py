@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from game_utils import bcolors
+
+# --- Session Scheduler ---
+# Deadlines for every open session on one hashed timer wheel. The server's accept loops
+# pair it with admission control (a cap on concurrent sessions).
+#
+# The wheel has WHEEL_SLOTS buckets of TICK seconds each. A timer goes in the bucket of
+# its expiry tick (timers further out than one turn wait in their bucket for later turns),
+# so scheduling and cancelling are O(1) whatever the number of sessions, and one ticker
+# (a thread, or a coroutine in asyncio mode) advances the wheel for all of them.
+#
+# A session_deadline is pushed back on every message without touching the wheel: arm()
+# only stores the new deadline. When the wheel timer fires early it re-schedules itself
+# for the stored deadline, so the wheel sees about one operation per timeout period per
+# session, not one per message.
+
+TICK = 0.1          # Seconds, the resolution of every deadline
+WHEEL_SLOTS = 1024  # Slots per turn, a turn is ~100 s with the default tick
+
+class timer_wheel:
+    def __init__(self, tick=TICK, slots=WHEEL_SLOTS, on_error=None):
+        self.tick = tick
+        self.on_error = on_error # Called with the exception of a failed callback, e.g. to log it
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(time.monotonic() / tick)
+        self.lock = threading.Lock()
+
+    def schedule(self, when, callback):
+        """Calls callback() from the ticker once monotonic time passes `when`. Returns the timer."""
+        with self.lock:
+            index = max(int(when / self.tick) + 1, self.current + 1)
+            timer = [index, callback]
+            self.slots[index % len(self.slots)].append(timer)
+        return timer
+
+    def cancel(self, timer):
+        timer[1] = None # Dropped from its slot the next time the wheel passes it
+
+    def advance(self, now=None):
+        """Moves the wheel up to now and runs every expired callback"""
+        target = int((time.monotonic() if now is None else now) / self.tick)
+        due = []
+        with self.lock:
+            while self.current < target:
+                self.current += 1
+                slot = self.slots[self.current % len(self.slots)]
+                if not slot:
+                    continue
+                keep = []
+                for timer in slot:
+                    if timer[1] is None:
+                        continue
+                    (due if timer[0] <= self.current else keep).append(timer)
+                slot[:] = keep
+        for timer in due:
+            callback, timer[1] = timer[1], None
+            # One broken callback must not stop the ticker, or no session would ever time out again
+            try:
+                callback()
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                else:
+                    print(f"{bcolors.FAIL}Timer callback failed: {e}{bcolors.ENDC}")
+
+    def run(self, stop):
+        """Ticker for threaded servers, until the stop Event is set"""
+        while not stop.wait(self.tick):
+            self.advance()
+
+    async def run_async(self):
+        """Ticker for asyncio servers, until cancelled"""
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
+
+class session_deadline:
+    """
+    The deadline of one session. on_expire() runs on the ticker once it passes,
+    and should break the session's pending I/O (e.g. shut the socket down).
+    """
+    def __init__(self, wheel, on_expire):
+        self.wheel = wheel
+        self.on_expire = on_expire
+        self.deadline = None
+        self.timer = None
+        self.timer_at = 0.0
+        self.expired = False
+
+    def arm(self, seconds):
+        """The session has to make progress within `seconds` from now"""
+        self.deadline = time.monotonic() + seconds
+        if self.timer is None or self.deadline < self.timer_at:
+            self._schedule(self.deadline)
+
+    def _schedule(self, when):
+        if self.timer is not None:
+            self.wheel.cancel(self.timer)
+        self.timer_at = when
+        self.timer = self.wheel.schedule(when, self._fire)
+
+    def _fire(self):
+        self.timer = None
+        deadline = self.deadline # Read once: cancel() may clear it from the session's thread meanwhile
+        if deadline is None:
+            return
+        if deadline > time.monotonic():
+            self._schedule(deadline) # Pushed back since this timer was set
+            return
+        self.expired = True
+        self.on_expire()
+
+    def cancel(self):
+        self.deadline = None
+        if self.timer is not None:
+            self.wheel.cancel(self.timer)
+            self.timer = None
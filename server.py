@@ -1,102 +1,182 @@
+import argparse
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import signal
 import socket
 import threading
-import struct
 import time
 # Ensure game_utils.py is in the same folder and has deck, player, dealer, game, bcolors classes
 from game_utils import *
+from strategy import TABLE_SIZE, decode_table, table_index
+from metrics import *
+from logpipe import DROP_POLICIES, LOG_CAPACITY, LOG_RATE, log_pipeline
+from history import history_store
+from scheduler import session_deadline, timer_wheel
+from rules import DEFAULT_SPEC, HAND_ACTIONS, SURRENDER_UNITS, parse_rules
+from shuffler import POOL_SIZE, RNGS, inline_shuffler, shoe_pool, shuffle_rng
+from discovery import LOAD_UNKNOWN, PROBE, PROBE_PORT, PROBE_TYPE, pack_offer
+from protocol import (BATCH_REQUEST_TYPE, KEEPALIVE_FLAG, MAGIC_COOKIE, MOVE, MOVE_SIZE, MSG_LOSS, MSG_ONGOING,
+                      MSG_WIN, REQUEST, REQUEST_SIZE, REQUEST_TYPE, STRATEGY_HEADER, STRATEGY_TYPE,
+                      pack_card, pack_result, pack_round, send_packets)
 
 # --- Network Constants ---
-MAGIC_COOKIE = 0xabcddcba
-OFFER_TYPE = 0x2
-REQUEST_TYPE = 0x3
-PAYLOAD_TYPE = 0x4
-
-MSG_WIN = 0x3
-MSG_LOSS = 0x2
-MSG_TIE = 0x1
-MSG_ONGOING = 0x0
-
+# Message types, layouts and packet builders are shared with the client, see protocol.py
 UDP_PORT = 13122
 TCP_PORT = 5555
 SERVER_NAME = "TeamTzion"
 
-# Mappings for protocol
-SUIT_MAP = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-RANK_MAP_INV = {
-    'Ace': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, 
-    '8': 8, '9': 9, '10': 10, 'Jack': 11, 'Queen': 12, 'King': 13
-}
+# --- Session Constants ---
+CLIENT_TIMEOUT = 60.0    # Each message (a decision) must arrive within this, however it is split up
+HANDSHAKE_TIMEOUT = 10.0 # From connecting to a complete request
+MAX_SESSIONS = 0         # Concurrent sessions per process, 0 = the mode's default below
+DEFAULT_MAX_SESSIONS = {"threaded": 2000, "asyncio": 20000}
+ADMIT_WAIT = 1.0         # How long a connection waits for a free session before it is turned away
+DRAIN_TIMEOUT = 30.0   # How long open sessions get to finish on shutdown
+RESTART_BACKOFF = 1.0  # Minimum lifetime of a worker before it is restarted right away
+
+# --- Game Settings ---
+RULES = parse_rules(DEFAULT_SPEC) # H17/S17, blackjack payout, doubles, surrender, see rules.py
+SHOE_DECKS = RULES.decks  # Casino tables use 6-8
+SHOE_PENETRATION = 0.0  # 0 reshuffles every round, like a fresh deck
+TABLE_SEATS = 1         # Clients sharing a shoe and dealer (asyncio mode), 1 = a private game each
+MAX_TABLE_SEATS = 7
+SHUFFLE_RNG = "secrets" # Where shoe orders come from, see shuffler.py
+SHUFFLE_SEED = None
+SHUFFLE_POOL = POOL_SIZE  # Ready shuffled shoes kept per shoe size, 0 = shuffle inside the round
+
+# --- Observability ---
+METRICS_PORT = 8555     # Prometheus text on http://127.0.0.1:METRICS_PORT/metrics, 0 = off
+LOG_SAMPLE = 0.0        # Share of per-event lines printed (1 = every event), errors always print
+# Sessions never print themselves: lines go through a queue to a background writer thread
+LOG = log_pipeline(on_drop=LOG_DROPPED.inc)
+
+# Every session's deadline, on one wheel advanced by the serving loop's ticker
+WHEEL = timer_wheel(on_error=lambda e: LOG.error(f"{bcolors.FAIL}Timer callback failed: %s{bcolors.ENDC}", e, exc_info=True))
+
+HISTORY = None          # history_store recording every round, set by --history
+HAND_LOG = None         # hand_log_writer, the binary round log set by --hand-log
+
+# Shuffler per number of decks, shared by every session of the process
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+RNG = shuffle_rng(SHUFFLE_RNG, SHUFFLE_SEED)
+
+def shoe_shuffler(decks):
+    """Where shoes of this size get their orders: a shoe_pool, or inline shuffles"""
+    pool = POOLS.get(decks)
+    if pool is None:
+        with POOLS_LOCK:
+            pool = POOLS.get(decks)
+            if pool is None:
+                if SHUFFLE_POOL:
+                    pool = shoe_pool(decks, RNG, SHUFFLE_POOL, on_miss=SHUFFLE_POOL_MISSES.inc)
+                else:
+                    pool = inline_shuffler(decks, RNG)
+                POOLS[decks] = pool
+    return pool
+
+def log(message, *args):
+    """Per-event log line (message % args), logged for a sampled share of events only"""
+    if LOG_SAMPLE and (LOG_SAMPLE >= 1 or random.random() < LOG_SAMPLE):
+        LOG.emit(message, *args)
+
+# Fixed message sizes, every read is exactly one message (REQUEST_SIZE, MOVE_SIZE from protocol)
+STRATEGY_SIZE = STRATEGY_HEADER.size + TABLE_SIZE # Cookie (4), Type (1), Use table (1), Table bitmap
 
 def card_to_net(c):
     """
     Converts a Card object to protocol integers (Rank, Suit).
     """
-    try:
-        # Check if suit is string or object and map to index 1-4
-        if c.suit in SUIT_MAP:
-            s_int = SUIT_MAP.index(c.suit) + 1 # +1 because protocol usually expects 1-4, not 0-3
-        else:
-            s_int = 1 # Default fallback
-            
-        r_int = RANK_MAP_INV.get(str(c.rank), 0)
-    except Exception as e:
-        print(f"Error converting card: {e}")
-        return 0, 0
-    return r_int, s_int
+    return c.net_rank, c.net_suit
 
-def send_card(sock, card_obj, result_code=MSG_ONGOING):
+def read_decision(move, hand):
     """
-    Helper function to send a card packet to the client.
+    What a move asks for under RULES: 'H' hit, 'D' double, 'R' surrender, 'S' stand.
+    Doubles and surrenders only count on the first two cards, anything else stands.
     """
-    try:
-        r, s = card_to_net(card_obj)
-        # Packing: Cookie (4), Type (1), Result (1), Rank (2), Suit (1)
-        packet = struct.pack("!IbBHB", MAGIC_COOKIE, PAYLOAD_TYPE, result_code, r, s)
-        sock.sendall(packet)
-        # Tiny sleep to ensure client processes the packet separately (prevents coalescing)
-        time.sleep(0.1) 
-    except Exception as e:
-        print(f"Error sending card: {e}")
+    # Support both 'hit' and 'hittt' etc.
+    if "hit" in move:
+        return "H"
+    if len(hand.hand) == 2:
+        if move.startswith("doub") and RULES.can_double[hand.soft][hand.total]:
+            return "D"
+        if move.startswith("surr") and RULES.surrender:
+            return "R"
+    return "S"
 
-def send_result(sock, result_code):
-    """
-    Helper function to send just a result (Win/Loss/Tie) without a specific card.
+def client_session():
     """
-    try:
-        packet = struct.pack("!IbBHB", MAGIC_COOKIE, PAYLOAD_TYPE, result_code, 0, 0)
-        sock.sendall(packet)
-        time.sleep(0.1)
-    except Exception as e:
-        print(f"Error sending result: {e}")
+    The offer/request/payload protocol for a single client, without any I/O.
 
-def handle_client(conn, addr):
-    print(f"{bcolors.BLUE}Connected to {addr}{bcolors.ENDC}")
-    try:
-        conn.settimeout(60.0) 
+    Yields an int to ask for exactly that many bytes (the data is sent back
+    into the generator, shorter only if the client disconnected), or a packet
+    (bytes) to be sent to the client. A missed deadline is thrown into the
+    generator as socket.timeout. Both the threaded and the asyncio server
+    drive this same generator.
+
+    A client that sends BATCH_REQUEST_TYPE instead of REQUEST_TYPE follows it
+    with a strategy frame and gets every round as ROUND_TYPE frames: the deal
+    in one frame, each hit in one frame, the dealer's turn and result in one
+    frame. If the strategy frame carries a table, the server plays the
+    client's decisions from it and the whole round is a single frame.
+
+    A request type with KEEPALIVE_FLAG set keeps the connection open after its
+    rounds: the client sends its next request on it, and so on, until it closes.
 
-        # 1. Handshake
-        data = conn.recv(1024)
-        if len(data) < 38: return
-        cookie, mtype, rounds, name_b = struct.unpack("!IbB32s", data[:38])
+    The drivers hold the packets yielded between two reads and flush them in one
+    write when the session asks for data or ends, e.g. the deal's three cards, or
+    the dealer's whole turn and the result.
+    """
+    # 1. Handshake
+    started = time.perf_counter()
+    data = yield REQUEST_SIZE
+    current_game = None
+    while True:
+        if len(data) < REQUEST_SIZE: return
+        cookie, mtype, rounds, name_b = REQUEST.unpack(data)
         if cookie != MAGIC_COOKIE: return
-        
+        if started is not None:
+            HANDSHAKE.observe(time.perf_counter() - started)
+        else:
+            REQUESTS_REUSED.inc()
+        keep_alive = bool(mtype & KEEPALIVE_FLAG)
+        mtype &= ~KEEPALIVE_FLAG
+    
         team_name = name_b.decode('utf-8', errors='ignore').strip('\x00')
-        print(f"Client {bcolors.CYAN}{team_name}{bcolors.ENDC} wants {rounds} rounds.")
+        log(f"Client {bcolors.CYAN}%s{bcolors.ENDC} wants %d rounds.", team_name, rounds)
+
+        batch = mtype == BATCH_REQUEST_TYPE
+        table = None
+        if batch:
+            data = yield STRATEGY_SIZE
+            if len(data) < STRATEGY_SIZE: return
+            cookie, mtype, use_table = STRATEGY_HEADER.unpack_from(data)
+            if cookie != MAGIC_COOKIE or mtype != STRATEGY_TYPE: return
+            if use_table:
+                table = decode_table(data[6:])
+            log("Client %s is batching (%s).", team_name, 'strategy table' if table else 'interactive')
 
         wins = 0
 
+        # One shoe, player and dealer for the whole connection, every round of every request reuses them
+        if current_game is None:
+            current_shoe = shoe(SHOE_DECKS, SHOE_PENETRATION, shoe_shuffler(SHOE_DECKS))
+            current_player = player(team_name)
+            current_dealer = dealer(rules=RULES)
+            current_game = game(current_dealer, current_player, current_shoe)
+
         # 2. Game Loop
         for r in range(1, rounds + 1):
-            print(f"{bcolors.HEADER}Round {r} starting for {team_name}{bcolors.ENDC}")
-            
+            log(f"{bcolors.HEADER}Round %d starting for %s{bcolors.ENDC}", r, team_name)
+            round_start = time.perf_counter()
+        
             try:
-                # Initialize Game
-                current_deck = deck()
-                current_player = player(team_name)
-                current_dealer = dealer()
-                current_game = game(current_dealer, current_player, current_deck)
+                # Deal a new round, reshuffling the shoe once the cut card is reached
                 current_game.start_round() 
-                
+            
                 # Deal initial cards
                 p_card1 = current_player.hand[0]
                 p_card2 = current_player.hand[1]
@@ -104,95 +184,498 @@ def handle_client(conn, addr):
                 d_card2 = current_dealer.hand[1]
 
                 # Send to client
-                send_card(conn, p_card1)
-                send_card(conn, p_card2)
-                send_card(conn, d_card1) # Dealer shows one card
+                if not batch:
+                    yield pack_card(p_card1)
+                    yield pack_card(p_card2)
+                    yield pack_card(d_card1) # Dealer shows one card
+                elif table is None:
+                    yield pack_round(MSG_ONGOING, [p_card1, p_card2], [d_card1])
 
 
                 # --- Player Turn ---
                 player_active = True
+                decisions = ""
+                stake = 1
+                surrendered = False
                 while player_active:
                     # Check for bust immediately
                     if current_player.is_busted():
                         player_active = False
                         break
-                    
-                    try:
-                        data = conn.recv(1024)
-                    except socket.timeout:
-                        print(f"Client {team_name} timed out.")
-                        return
+                
+                    if table is not None:
+                        move = "hit" if table[table_index(current_player.total, current_player.soft, d_card1.value())] else "stand"
+                    else:
+                        try:
+                            waiting = time.perf_counter()
+                            data = yield MOVE_SIZE
+                            # The client sends a line break after its request, skip it if it comes before a move
+                            while data[:1] == b'\n':
+                                data = data[1:] + (yield 1)
+                        except socket.timeout:
+                            log("Client %s timed out.", team_name)
+                            return
+                        DECISION_WAIT.observe(time.perf_counter() - waiting)
 
-                    if not data: break
+                        if len(data) < MOVE_SIZE: break
                     
-                    # Decode move (Expects 10 bytes: Cookie + Type + 5 bytes payload)
-                    if len(data) >= 10:
-                        _, _, move_b = struct.unpack("!Ib5s", data[:10])
+                        # Decode move (Cookie + Type + 5 bytes payload)
+                        _, _, move_b = MOVE.unpack(data)
                         move = move_b.decode('utf-8', errors='ignore').strip('\x00').lower()
-                    else:
-                        move = "stand"
-
-                    print(f"Received move: '{move}'") 
-
-                    # Support both 'hit' and 'hittt' etc.
-                    if "hit" in move:
-                        new_card = current_deck.deal()
-                        current_player.receive_card(new_card)
-                        
-                        if current_player.is_busted():
-                            # Send the card that caused bust, plus LOSS signal
-                            send_card(conn, new_card, MSG_LOSS)
-                            player_active = False 
-                        else:
-                            send_card(conn, new_card, MSG_ONGOING)
-                    else:
-                        # Anything that isn't 'hit' is considered 'stand'
+
+                    log("Received move: '%s'", move)
+
+                    decision = read_decision(move, current_player)
+                    decisions += decision
+                    if decision == "S":
+                        break
+                    if decision == "R":
+                        surrendered = True
+                        break
+                    if decision == "D":
+                        # One more card at twice the stake, then the hand stands
+                        stake = 2
+                        player_active = False
+
+                    new_card = current_shoe.deal()
+                    current_player.receive_card(new_card)
+                    HITS.inc()
+
+                    # Send the card, plus LOSS signal if it caused a bust
+                    result = MSG_LOSS if current_player.is_busted() else MSG_ONGOING
+                    if not batch:
+                        yield pack_card(new_card, result)
+                    elif table is None:
+                        yield pack_round(result, [new_card], [])
+                    if result == MSG_LOSS:
+                        BUSTS.inc()
                         player_active = False
 
                 # --- Dealer Turn ---
-                # Dealer only plays if player is not busted
-                if not current_player.is_busted():
-                    send_card(conn, d_card2) # Reveal dealer's second card
-                    
+                # Dealer only plays if the player's hand is still standing
+                result = MSG_LOSS
+                units = -stake
+                if surrendered:
+                    units = SURRENDER_UNITS
+                    if not batch:
+                        yield pack_result(result)
+                    elif table is None:
+                        yield pack_round(result, [], [])
+                elif not current_player.is_busted():
+                    if not batch:
+                        yield pack_card(d_card2) # Reveal dealer's second card
+                
                     while current_dealer.should_hit():
-                        new_d = current_deck.deal()
+                        new_d = current_shoe.deal()
                         current_dealer.receive_card(new_d)
-                        send_card(conn, new_d)
+                        if not batch:
+                            yield pack_card(new_d)
 
                     p_val = current_player.calculate_hand_value()
                     d_val = current_dealer.calculate_hand_value()
-                    
-                    print(f"Results: Player={p_val}, Dealer={d_val}")
+                
+                    log("Results: Player=%d, Dealer=%d", p_val, d_val)
 
-                    if current_dealer.is_busted():
-                        wins += 1
-                        send_result(conn, MSG_WIN)
-                    elif p_val > d_val:
+                    result, units = RULES.outcome(p_val, len(current_player.hand), d_val, len(current_dealer.hand))
+                    units *= stake
+                    if result == MSG_WIN:
                         wins += 1
-                        send_result(conn, MSG_WIN)
-                    elif d_val > p_val:
-                        send_result(conn, MSG_LOSS)
-                    else:
-                        send_result(conn, MSG_TIE)
 
-                print(f"Round {r} done.")
-                
+                    if not batch:
+                        yield pack_result(result)
+                    elif table is None:
+                        yield pack_round(result, [], current_dealer.hand[1:])
+
+                if table is not None:
+                    # The whole round in one frame: dealer cards beyond the upcard only if the dealer played
+                    shown = [d_card1] if current_player.is_busted() else current_dealer.hand
+                    yield pack_round(result, current_player.hand, shown)
+
+                ROUNDS.inc()
+                OUTCOMES[result].inc()
+                PLAYER_UNITS.inc(units)
+                ROUND_DURATION.observe(time.perf_counter() - round_start)
+                if HISTORY is not None:
+                    HISTORY.record(team_name, current_player.hand, decisions, current_dealer.hand, result)
+                if HAND_LOG is not None:
+                    HAND_LOG.write(current_player.hand, current_dealer.hand, result, HAND_ACTIONS.get(decisions[-1:], 0))
+                log("Round %d done.", r)
+            
             except Exception as game_err:
-                print(f"{bcolors.FAIL}CRASH IN ROUND {r}: {game_err}{bcolors.ENDC}")
-                import traceback
-                traceback.print_exc() 
+                LOG.error(f"{bcolors.FAIL}CRASH IN ROUND %d: %s{bcolors.ENDC}", r, game_err, exc_info=True)
                 return
 
         if rounds > 0:
-            print(f"Client {team_name} finished. Wins: {wins}")
-            
+            log("Client %s finished. Wins: %d", team_name, wins)
+
+        if not keep_alive:
+            return
+        # Keep-alive: the connection waits for the client's next request (within CLIENT_TIMEOUT)
+        started = None
+        data = yield REQUEST_SIZE
+        while data[:1] == b'\n':
+            data = data[1:] + (yield 1)
+
+def abort_socket(conn):
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass # Already closed
+
+def handle_client(conn, addr):
+    """
+    Threaded mode: drives a client_session with blocking socket calls.
+    """
+    log(f"{bcolors.BLUE}Connected to %s{bcolors.ENDC}", addr)
+    SESSIONS.inc()
+    SESSIONS_ACTIVE.inc()
+    session = client_session()
+    # Past the deadline the socket is shut down, which breaks any recv or send in progress
+    deadline = session_deadline(WHEEL, lambda: abort_socket(conn))
+    pending = [] # Packets since the last read, sent together before the next one
+
+    def flush():
+        try:
+            SENDS.inc(send_packets(conn, pending))
+            PACKETS_SENT.inc(len(pending))
+        except Exception as e:
+            if not deadline.expired:
+                LOG.error("Error sending card: %s", e)
+        pending.clear()
+
+    try:
+        deadline.arm(HANDSHAKE_TIMEOUT)
+        op = next(session)
+        while True:
+            if isinstance(op, int):
+                if pending:
+                    flush()
+                try:
+                    data = recv_exact(conn, op)
+                except OSError:
+                    data = b''
+                if deadline.expired:
+                    op = session.throw(socket.timeout())
+                    continue
+                deadline.arm(CLIENT_TIMEOUT)
+                op = session.send(data)
+            else:
+                pending.append(op)
+                op = session.send(None)
+    except StopIteration:
+        if pending:
+            flush()
+    except socket.timeout:
+        log("Session %s timed out.", addr)
     except Exception as e:
-        print(f"{bcolors.FAIL}General Error: {e}{bcolors.ENDC}")
-        import traceback
-        traceback.print_exc()
+        LOG.error(f"{bcolors.FAIL}General Error: %s{bcolors.ENDC}", e, exc_info=True)
     finally:
+        deadline.cancel()
+        if deadline.expired:
+            SESSIONS_TIMED_OUT.inc()
+        session.close()
+        SESSIONS_ACTIVE.dec()
         conn.close()
+
+async def handle_client_async(reader, writer, request=None):
+    """
+    Asyncio mode: drives a client_session on a coroutine instead of a thread.
+    request is the handshake if the caller has already read it.
+    """
+    addr = writer.get_extra_info('peername')
+    log(f"{bcolors.BLUE}Connected to %s{bcolors.ENDC}", addr)
+    SESSIONS.inc()
+    SESSIONS_ACTIVE.inc()
+    session = client_session()
+    # Past the deadline the transport is aborted, which ends a pending read or drain
+    deadline = session_deadline(WHEEL, writer.transport.abort)
+    pending = [] # Packets since the last read, handed to the transport as one write
+
+    async def flush():
+        try:
+            writer.writelines(pending)
+            SENDS.inc()
+            PACKETS_SENT.inc(len(pending))
+            await writer.drain()
+        except Exception as e:
+            if not deadline.expired:
+                LOG.error("Error sending card: %s", e)
+        pending.clear()
+
+    try:
+        deadline.arm(HANDSHAKE_TIMEOUT)
+        op = next(session)
+        if request is not None:
+            op = session.send(request)
+        while True:
+            if isinstance(op, int):
+                if pending:
+                    await flush()
+                try:
+                    data = await reader.readexactly(op)
+                except asyncio.IncompleteReadError as e:
+                    data = e.partial
+                except OSError:
+                    data = b''
+                if deadline.expired:
+                    op = session.throw(socket.timeout())
+                    continue
+                deadline.arm(CLIENT_TIMEOUT)
+                op = session.send(data)
+            else:
+                pending.append(op)
+                op = session.send(None)
+    except StopIteration:
+        if pending:
+            await flush()
+    except socket.timeout:
+        log("Session %s timed out.", addr)
+    except Exception as e:
+        LOG.error(f"{bcolors.FAIL}General Error: %s{bcolors.ENDC}", e, exc_info=True)
+    finally:
+        deadline.cancel()
+        if deadline.expired:
+            SESSIONS_TIMED_OUT.inc()
+        session.close()
+        SESSIONS_ACTIVE.dec()
+        writer.close()
         
+# --- Tables ---
+# With --table-seats N (asyncio mode) up to N legacy clients play at one table: one shoe,
+# one dealer hand per round. Each table is a single coroutine. It deals every seat, then
+# takes the seats' turns in order, plays the dealer once and sends each seat its result.
+# Seats that connect mid-round are dealt in from the next round. A seat that times out or
+# disconnects leaves the table without holding up the others.
+
+TABLES = []
+
+class table_seat:
+    def __init__(self, reader, writer, team_name, rounds):
+        self.reader = reader
+        self.writer = writer
+        self.team_name = team_name
+        self.rounds = rounds
+        self.played = 0
+        self.wins = 0
+        self.hand = player(team_name)
+        self.decisions = ""
+        self.left = False
+        # Only armed while the table waits on this seat, not while others play
+        self.deadline = session_deadline(WHEEL, writer.transport.abort)
+        self.done = asyncio.get_running_loop().create_future()
+
+class blackjack_table:
+    def __init__(self, seats):
+        self.max_seats = seats
+        # Enough decks that a full shoe holds the longest round a full table can play
+        decks = SHOE_DECKS
+        while round_cards(decks, seats) > decks * len(CARDS):
+            decks += 1
+        self.shoe = shoe(decks, SHOE_PENETRATION, shoe_shuffler(decks))
+        self.dealer = dealer(rules=RULES)
+        self.seats = []
+        self.joining = []
+        self.task = None
+
+    def has_room(self):
+        return len(self.seats) + len(self.joining) < self.max_seats
+
+    def join(self, seat):
+        self.joining.append(seat)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        try:
+            while self.seats or self.joining:
+                self.seats += self.joining
+                self.joining.clear()
+                for seat in self.seats:
+                    if seat.left or seat.played >= seat.rounds:
+                        self.leave(seat)
+                self.seats = [seat for seat in self.seats if not seat.done.done()]
+                if self.seats:
+                    await self.play_round(self.seats)
+        except Exception as e:
+            LOG.error(f"{bcolors.FAIL}CRASH AT TABLE: %s{bcolors.ENDC}", e, exc_info=True)
+        finally:
+            TABLES.remove(self)
+            for seat in self.seats + self.joining:
+                self.leave(seat)
+
+    def leave(self, seat):
+        if not seat.done.done():
+            if seat.played:
+                log("Client %s finished. Wins: %d", seat.team_name, seat.wins)
+            seat.done.set_result(None)
+
+    async def play_round(self, seats):
+        round_start = time.perf_counter()
+        # Reshuffled unless what is left covers the longest round these seats can play (see round_cards)
+        if self.shoe.needs_shuffle() or self.shoe.count() < round_cards(self.shoe.decks, len(seats)):
+            self.shoe.reset()
+            self.shoe.shuffle()
+        d = self.dealer
+        d.reset_hand()
+        for seat in seats:
+            seat.hand.reset_hand()
+            seat.decisions = ""
+        # Deal like a casino: a card to every seat and the dealer, twice
+        for _ in range(2):
+            for seat in seats:
+                seat.hand.receive_card(self.shoe.deal())
+            d.receive_card(self.shoe.deal())
+        upcard = pack_card(d.hand[0])
+        for seat in seats:
+            self.send(seat, [pack_card(seat.hand.hand[0]), pack_card(seat.hand.hand[1]), upcard])
+        await self.flush(seats)
+
+        # --- Player Turns, one seat after the other ---
+        for seat in seats:
+            while not seat.left and not seat.hand.is_busted():
+                move = await self.read_move(seat)
+                if move is None:
+                    break
+                log("Received move: '%s'", move)
+                decision = read_decision(move, seat.hand)
+                seat.decisions += decision
+                if decision == "S":
+                    break
+                if decision == "R":
+                    # Half the stake back, the round is over for this seat
+                    self.send(seat, [pack_result(MSG_LOSS)])
+                    await self.flush([seat])
+                    break
+                new_card = self.shoe.deal()
+                seat.hand.receive_card(new_card)
+                HITS.inc()
+                result = MSG_LOSS if seat.hand.is_busted() else MSG_ONGOING
+                self.send(seat, [pack_card(new_card, result)])
+                await self.flush([seat])
+                if result == MSG_LOSS:
+                    BUSTS.inc()
+                if decision == "D":
+                    break # One card at twice the stake, then the hand stands
+
+        # --- Dealer Turn, once for the whole table ---
+        standing = [seat for seat in seats
+                    if not seat.left and not seat.hand.is_busted() and not seat.decisions.endswith("R")]
+        if standing:
+            d.play_turn(self.shoe)
+            reveal = [pack_card(c) for c in d.hand[1:]]
+        d_val = d.calculate_hand_value()
+        for seat in seats:
+            if seat.left:
+                continue
+            stake = 2 if seat.decisions.endswith("D") else 1
+            if seat.decisions.endswith("R"):
+                result, units = MSG_LOSS, SURRENDER_UNITS # Already sent at the seat's turn
+                dealer_cards = d.hand[:2]
+            elif seat.hand.is_busted():
+                result, units = MSG_LOSS, -stake # Already sent with the busting card
+                dealer_cards = d.hand[:2]
+            else:
+                result, units = RULES.outcome(seat.hand.total, len(seat.hand.hand), d_val, len(d.hand))
+                units *= stake
+                self.send(seat, [*reveal, pack_result(result)])
+                dealer_cards = d.hand
+            seat.played += 1
+            seat.wins += result == MSG_WIN
+            ROUNDS.inc()
+            OUTCOMES[result].inc()
+            PLAYER_UNITS.inc(units)
+            ROUND_DURATION.observe(time.perf_counter() - round_start)
+            if HISTORY is not None:
+                HISTORY.record(seat.team_name, seat.hand.hand, seat.decisions, dealer_cards, result)
+            if HAND_LOG is not None:
+                HAND_LOG.write(seat.hand.hand, dealer_cards, result, HAND_ACTIONS.get(seat.decisions[-1:], 0))
+        await self.flush(standing)
+
+    async def read_move(self, seat):
+        """The seat's next move, or None once it has left"""
+        seat.deadline.arm(CLIENT_TIMEOUT)
+        waiting = time.perf_counter()
+        try:
+            data = await seat.reader.readexactly(MOVE_SIZE)
+            # The client sends a line break after its request, skip it if it comes before a move
+            while data[:1] == b'\n':
+                data = data[1:] + await seat.reader.readexactly(1)
+        except (asyncio.IncompleteReadError, OSError):
+            seat.left = True
+            if seat.deadline.expired:
+                log("Client %s timed out.", seat.team_name)
+            return None
+        finally:
+            seat.deadline.cancel()
+        DECISION_WAIT.observe(time.perf_counter() - waiting)
+        _, _, move_b = MOVE.unpack(data)
+        return move_b.decode('utf-8', errors='ignore').strip('\x00').lower()
+
+    def send(self, seat, packets):
+        """Queues packets for a seat as one transport write, flush() sends them"""
+        seat.writer.writelines(packets)
+        SENDS.inc()
+        PACKETS_SENT.inc(len(packets))
+
+    async def flush(self, seats):
+        """Waits for the packets written to the seats to go out, marking seats that are gone"""
+        for seat in seats:
+            if seat.writer.transport.is_closing():
+                seat.left = True
+            elif seat.writer.transport.get_write_buffer_size():
+                seat.deadline.arm(CLIENT_TIMEOUT)
+                try:
+                    await seat.writer.drain()
+                except (ConnectionError, OSError):
+                    seat.left = True
+                finally:
+                    seat.deadline.cancel()
+
+def find_table():
+    """A table with a free seat, or a new one"""
+    for t in TABLES:
+        if t.has_room():
+            return t
+    t = blackjack_table(TABLE_SEATS)
+    TABLES.append(t)
+    return t
+
+async def handle_seat_async(reader, writer):
+    """
+    Table mode: reads the request and seats the client at a shared table.
+    Anything but a legacy request (e.g. a batch client) gets its own session as usual.
+    """
+    started = time.perf_counter()
+    deadline = session_deadline(WHEEL, writer.transport.abort)
+    deadline.arm(HANDSHAKE_TIMEOUT)
+    try:
+        request = await reader.readexactly(REQUEST_SIZE)
+    except (asyncio.IncompleteReadError, OSError):
+        writer.close()
+        return
+    finally:
+        deadline.cancel()
+    cookie, mtype, rounds, name_b = REQUEST.unpack(request)
+    if cookie != MAGIC_COOKIE or mtype != REQUEST_TYPE:
+        await handle_client_async(reader, writer, request)
+        return
+    HANDSHAKE.observe(time.perf_counter() - started)
+
+    team_name = name_b.decode('utf-8', errors='ignore').strip('\x00')
+    log(f"Client {bcolors.CYAN}%s{bcolors.ENDC} wants %d rounds at a table.", team_name, rounds)
+    SESSIONS.inc()
+    SESSIONS_ACTIVE.inc()
+    seat = table_seat(reader, writer, team_name, rounds)
+    find_table().join(seat)
+    try:
+        await seat.done
+    finally:
+        seat.left = True
+        if seat.deadline.expired:
+            SESSIONS_TIMED_OUT.inc()
+        SESSIONS_ACTIVE.dec()
+        writer.close()
+
 def get_local_ip():
     """Helper to dynamically get the local LAN IP"""
     try:
@@ -204,7 +687,11 @@ def get_local_ip():
     except Exception:
         return "127.0.0.1"
 
-def udp_broadcast():
+def current_offer(tcp_port, capacity, counted, nonce=0):
+    """The offer with the current load. Pre-fork workers count their own sessions, so their parent can't."""
+    return pack_offer(tcp_port, SERVER_NAME, SESSIONS_ACTIVE.value if counted else LOAD_UNKNOWN, capacity, nonce)
+
+def udp_broadcast(tcp_port=TCP_PORT, capacity=0, counted=True):
     # Dynamically find IP to avoid crashes when IP changes
     MY_IP = get_local_ip()
     BROADCAST_IP = "172.18.255.255" # Keep this, or use '<broadcast>' if supported
@@ -221,44 +708,351 @@ def udp_broadcast():
 
     print(f"{bcolors.GREEN}Server started, listening on IP address {MY_IP}{bcolors.ENDC}")
     
-    msg = struct.pack("!IbH32s", MAGIC_COOKIE, OFFER_TYPE, TCP_PORT, SERVER_NAME.encode().ljust(32, b'\x00'))
-    
     while True:
         try:
-            sock.sendto(msg, (BROADCAST_IP, UDP_PORT))
+            # Rebuilt every time, it carries the current load
+            sock.sendto(current_offer(tcp_port, capacity, counted), (BROADCAST_IP, UDP_PORT))
             time.sleep(1)
         except Exception as e:
             # Silence broadcast errors on shutdown
             time.sleep(1)
 
-if __name__ == "__main__":
-    # Start UDP Broadcast in background thread
-    t = threading.Thread(target=udp_broadcast, daemon=True)
-    t.start()
-    
+def probe_responder(tcp_port=TCP_PORT, capacity=0, counted=True):
+    """
+    Answers discovery probes right away with an offer, so clients don't wait for the next broadcast.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(('', PROBE_PORT))
+    except Exception as e:
+        print(f"Error binding probe port: {e}")
+        return
+
+    while True:
+        try:
+            data, addr = sock.recvfrom(1024)
+            if len(data) < PROBE.size:
+                continue # Shorter than the answer, see discovery.PROBE
+            cookie, mtype, nonce = PROBE.unpack(data[:PROBE.size])
+            if cookie == MAGIC_COOKIE and mtype == PROBE_TYPE:
+                sock.sendto(current_offer(tcp_port, capacity, counted, nonce), addr)
+        except Exception:
+            time.sleep(0.01) # e.g. ICMP errors from a client that went away
+
+def serve_threaded(port, reuse_port=False):
+    """
+    Threaded mode: one thread per client. SIGTERM stops accepting and drains the open sessions.
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
     # Start TCP Server
     tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    tcp.bind(("0.0.0.0", TCP_PORT))
+    if reuse_port:
+        # Every worker binds its own socket to the port, the kernel spreads connections between them
+        tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    tcp.bind(("0.0.0.0", port))
     tcp.listen()
     
     # --- CRITICAL FIX: Set timeout to allow Ctrl+C check ---
     tcp.settimeout(1.0)
     # -------------------------------------------------------
 
-    print(f"TCP server listening on port {TCP_PORT}")
+    print(f"TCP server listening on port {port}")
+
+    active = 0
+    drained = threading.Condition()
+    slots = threading.BoundedSemaphore(MAX_SESSIONS or DEFAULT_MAX_SESSIONS["threaded"])
+    ticking = threading.Event()
+    threading.Thread(target=WHEEL.run, args=(ticking,), name="timer-wheel", daemon=True).start()
+
+    def run_session(c, a):
+        nonlocal active
+        try:
+            handle_client(c, a)
+        finally:
+            slots.release()
+            with drained:
+                active -= 1
+                drained.notify_all()
     
+    while not stop.is_set():
+        try:
+            c, a = tcp.accept()
+            # Saturated: stop accepting for a moment (new clients queue in the listen backlog),
+            # then turn this one away rather than start yet another thread
+            if not slots.acquire(timeout=ADMIT_WAIT):
+                SESSIONS_REJECTED.inc()
+                c.close()
+                continue
+            # Small messages go out immediately instead of waiting on Nagle (asyncio does this by default)
+            c.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with drained:
+                active += 1
+            threading.Thread(target=run_session, args=(c, a), daemon=True).start()
+        except socket.timeout:
+            # Loop back to check for KeyboardInterrupt
+            pass
+        except Exception as e:
+            print(f"Server Error: {e}")
+
+    tcp.close()
+    print(f"{bcolors.WARNING}Draining {active} sessions...{bcolors.ENDC}")
+    with drained:
+        drained.wait_for(lambda: active == 0, timeout=DRAIN_TIMEOUT)
+    ticking.set()
+
+async def serve_async(port, reuse_port=False):
+    """
+    Asyncio mode: one coroutine per client. SIGTERM stops accepting and drains the open sessions.
+    """
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    sessions = set()
+    slots = asyncio.Semaphore(MAX_SESSIONS or DEFAULT_MAX_SESSIONS["asyncio"])
+    ticker = asyncio.create_task(WHEEL.run_async())
+    handle = handle_seat_async if TABLE_SEATS > 1 else handle_client_async
+
+    async def run_session(reader, writer):
+        if slots.locked():
+            # Saturated: the connection waits a moment for a free session, then is turned away
+            try:
+                await asyncio.wait_for(slots.acquire(), ADMIT_WAIT)
+            except asyncio.TimeoutError:
+                SESSIONS_REJECTED.inc()
+                writer.close()
+                return
+        else:
+            await slots.acquire()
+        task = asyncio.current_task()
+        sessions.add(task)
+        try:
+            await handle(reader, writer)
+        finally:
+            sessions.discard(task)
+            slots.release()
+
+    server = await asyncio.start_server(
+        run_session, "0.0.0.0", port,
+        reuse_address=True, reuse_port=reuse_port, backlog=socket.SOMAXCONN)
+    print(f"TCP server (asyncio) listening on port {port}")
+    await stop.wait()
+
+    server.close()
+    print(f"{bcolors.WARNING}Draining {len(sessions)} sessions...{bcolors.ENDC}")
+    if sessions:
+        await asyncio.wait(sessions, timeout=DRAIN_TIMEOUT)
+    ticker.cancel()
+
+PARENT_CHECK = 1.0 # Seconds between a worker's checks that the parent is still alive
+
+def watch_parent(parent):
+    """
+    Drains the worker (as on SIGTERM) once its parent is gone, e.g. killed with SIGKILL:
+    an orphaned worker would otherwise keep serving the port forever.
+    """
+    while os.getppid() == parent:
+        time.sleep(PARENT_CHECK)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+def worker_seed(seed, slot, generation):
+    """
+    A worker's own seed: different per slot and per restart of a slot (a restarted worker
+    must not replay the shoes of the one it replaces), and never another run's seed + slot.
+    """
+    return random.Random(f"{seed}/{slot}/{generation}").getrandbits(64)
+
+def worker_main(args, slot, generation=0):
+    """
+    Entry point of a pre-fork worker: serves its own SO_REUSEPORT socket until SIGTERM.
+    """
+    # Ctrl+C reaches the whole process group, the parent decides when workers drain
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threading.Thread(target=watch_parent, args=(args.parent_pid,), name="parent-watch", daemon=True).start()
+    if args.hand_log:
+        # A log per worker: records from two processes must not interleave in one file
+        args.hand_log = f"{args.hand_log}.{slot}"
+    if args.seed is not None:
+        args.seed = worker_seed(args.seed, slot, generation) # Workers must not deal the same shoes
+    configure(args)
+    if args.metrics_port:
+        # Every worker exports its own metrics, on the next port up
+        serve_metrics(args.metrics_port + slot)
+    try:
+        if args.mode == "asyncio":
+            asyncio.run(serve_async(args.port, reuse_port=True))
+        else:
+            serve_threaded(args.port, reuse_port=True)
+    finally:
+        if HISTORY is not None:
+            HISTORY.close()
+        if HAND_LOG is not None:
+            HAND_LOG.close()
+        LOG.close()
+
+def serve_workers(args, workers):
+    """
+    Pre-fork mode: starts `workers` processes sharing the port and restarts any that die.
+    On Ctrl+C or SIGTERM every worker is asked to drain, and killed if it is still busy after DRAIN_TIMEOUT.
+    """
+    def on_sigterm(signum, frame):
+        raise KeyboardInterrupt # A service manager's stop drains the workers like Ctrl+C
+    signal.signal(signal.SIGTERM, on_sigterm)
+    args.parent_pid = os.getpid()
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+    started = {}
+    generations = {} # Restarts per slot
+
+    def start_worker(slot):
+        generations[slot] = generations.get(slot, -1) + 1
+        p = ctx.Process(target=worker_main, args=(args, slot, generations[slot]), name=f"worker-{slot}")
+        p.start()
+        procs[slot] = p
+        started[slot] = time.time()
+
+    for slot in range(workers):
+        start_worker(slot)
+    print(f"{bcolors.GREEN}Started {workers} {args.mode} workers on port {args.port}{bcolors.ENDC}")
+
     try:
         while True:
-            try:
-                c, a = tcp.accept()
-                threading.Thread(target=handle_client, args=(c, a), daemon=True).start()
-            except socket.timeout:
-                # Loop back to check for KeyboardInterrupt
-                pass
-            except Exception as e:
-                print(f"Server Error: {e}")
+            multiprocessing.connection.wait([p.sentinel for p in procs.values()], timeout=1.0)
+            for slot, p in list(procs.items()):
+                if p.is_alive():
+                    continue
+                print(f"{bcolors.FAIL}Worker {slot} (pid {p.pid}) exited with code {p.exitcode}, restarting{bcolors.ENDC}")
+                # Don't spin if a worker dies straight away
+                if time.time() - started[slot] < RESTART_BACKOFF:
+                    time.sleep(RESTART_BACKOFF)
+                start_worker(slot)
+    except KeyboardInterrupt:
+        # A second signal must not cut the drain short
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        print(f"\n{bcolors.WARNING}Draining workers...{bcolors.ENDC}")
+        for p in procs.values():
+            p.terminate()
+        deadline = time.time() + DRAIN_TIMEOUT + 1
+        for p in procs.values():
+            p.join(max(0, deadline - time.time()))
+            if p.is_alive():
+                p.kill()
+        raise
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Blackjack game server")
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded",
+                        help="threaded: one thread per client, asyncio: one coroutine per client")
+    parser.add_argument("--port", type=int, default=TCP_PORT, help="TCP port to listen on")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port with SO_REUSEPORT (0 = one per CPU)")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS,
+                        help="concurrent sessions per process, more wait briefly and are then turned away "
+                             f"(0 = {DEFAULT_MAX_SESSIONS['threaded']} threaded, {DEFAULT_MAX_SESSIONS['asyncio']} asyncio)")
+    parser.add_argument("--client-timeout", type=float, default=CLIENT_TIMEOUT,
+                        help="seconds a client has for each message, e.g. a decision")
+    parser.add_argument("--handshake-timeout", type=float, default=HANDSHAKE_TIMEOUT,
+                        help="seconds from connecting to a complete request")
+    parser.add_argument("--table-seats", type=int, default=TABLE_SEATS,
+                        help=f"clients sharing a shoe and dealer, up to {MAX_TABLE_SEATS} (asyncio mode only)")
+    parser.add_argument("--rules", default=DEFAULT_SPEC,
+                        help='rule set, e.g. "h17,decks=6,bj=6:5,double=10-11,surrender" (see rules.py)')
+    parser.add_argument("--decks", type=int, help="decks in each session's shoe (overrides the rule set's)")
+    parser.add_argument("--penetration", type=float, default=SHOE_PENETRATION,
+                        help="share of the shoe dealt before reshuffling (0 = reshuffle every round)")
+    parser.add_argument("--rng", choices=RNGS, default=SHUFFLE_RNG,
+                        help="shuffle RNG: secrets (OS CSPRNG), random, or numpy (seedable PCG64)")
+    parser.add_argument("--seed", type=int, default=SHUFFLE_SEED, help="seed for --rng random/numpy")
+    parser.add_argument("--shuffle-pool", type=int, default=SHUFFLE_POOL,
+                        help="pre-shuffled shoes kept ready by a background thread (0 = shuffle in the round)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="local port for /metrics, workers use the following ports (0 = off)")
+    parser.add_argument("--log-sample", type=float, default=LOG_SAMPLE,
+                        help="share of per-event log lines to print, 0-1")
+    parser.add_argument("--history", metavar="DB",
+                        help="record every round in this SQLite file (workers share it), see history.py")
+    parser.add_argument("--hand-log", metavar="FILE",
+                        help="append every round to this binary hand log (workers add .N), see handlog.py")
+    parser.add_argument("--log-file", help="append the log to this file instead of stdout")
+    parser.add_argument("--log-rate", type=int, default=LOG_RATE,
+                        help="most log lines per second before lines are dropped (0 = unlimited)")
+    parser.add_argument("--log-queue", type=int, default=LOG_CAPACITY,
+                        help="most log lines waiting for the writer thread")
+    parser.add_argument("--log-drop", choices=DROP_POLICIES, default="newest",
+                        help="which line to drop when the log queue is full")
+    args = parser.parse_args()
+    try:
+        parse_rules(args.rules, args.decks)
+    except ValueError as e:
+        parser.error(f"--rules: {e}")
+    if not 0 <= args.penetration < 1:
+        parser.error("--penetration must be at least 0 and below 1")
+    if not 1 <= args.table_seats <= MAX_TABLE_SEATS:
+        parser.error(f"--table-seats must be 1-{MAX_TABLE_SEATS}")
+    if args.table_seats > 1 and args.mode != "asyncio":
+        parser.error("--table-seats needs --mode asyncio, a table is one coroutine")
+    return args
+
+def configure(args, stores=True):
+    """
+    Applies the command line game settings (also called in every worker process).
+    stores: open the history and hand log, not in a pre-fork parent (workers open their own).
+    """
+    global RULES, SHOE_DECKS, SHOE_PENETRATION, LOG_SAMPLE, LOG, HISTORY, HAND_LOG
+    global MAX_SESSIONS, CLIENT_TIMEOUT, HANDSHAKE_TIMEOUT, TABLE_SEATS
+    global SHUFFLE_POOL, RNG
+    SHUFFLE_POOL = args.shuffle_pool
+    RNG = shuffle_rng(args.rng, args.seed)
+    TABLE_SEATS = args.table_seats
+    MAX_SESSIONS = args.max_sessions
+    CLIENT_TIMEOUT = args.client_timeout
+    HANDSHAKE_TIMEOUT = args.handshake_timeout
+    RULES = parse_rules(args.rules, args.decks)
+    SHOE_DECKS = RULES.decks
+    SHOE_PENETRATION = args.penetration
+    LOG_SAMPLE = args.log_sample
+    stream = open(args.log_file, "a", buffering=1 << 16) if args.log_file else None
+    LOG = log_pipeline(stream, args.log_queue, args.log_rate, args.log_drop, on_drop=LOG_DROPPED.inc).start()
+    if not stores:
+        return
+    if args.history:
+        HISTORY = history_store(args.history, on_drop=HISTORY_DROPPED.inc)
+    if args.hand_log:
+        from handlog import hand_log_writer # Needs NumPy, only imported when logging hands
+        HAND_LOG = hand_log_writer(args.hand_log, RULES, on_skip=HAND_LOG_SKIPPED.inc)
+
+if __name__ == "__main__":
+    args = parse_args()
+    workers = args.workers or os.cpu_count()
+    configure(args, stores=workers == 1)
+    raise_fd_limit()
+
+    # Start UDP Broadcast in background thread (one advertiser, even with several workers)
+    capacity = (args.max_sessions or DEFAULT_MAX_SESSIONS[args.mode]) * workers
+    t = threading.Thread(target=udp_broadcast, args=(args.port, capacity, workers == 1), daemon=True)
+    t.start()
+    threading.Thread(target=probe_responder, args=(args.port, capacity, workers == 1), daemon=True).start()
+    
+    if workers == 1 and args.metrics_port and serve_metrics(args.metrics_port):
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    
+    try:
+        if workers > 1:
+            serve_workers(args, workers)
+        elif args.mode == "asyncio":
+            asyncio.run(serve_async(args.port))
+        else:
+            serve_threaded(args.port)
                 
     except KeyboardInterrupt:
         print(f"\n{bcolors.WARNING}Server shutting down...{bcolors.ENDC}")
-        tcp.close()
\ No newline at end of file
+    finally:
+        if HISTORY is not None:
+            HISTORY.close()
+        if HAND_LOG is not None:
+            HAND_LOG.close()
+        LOG.close()
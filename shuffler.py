@@ -0,0 +1,100 @@
+import random
+import threading
+from array import array
+from collections import deque
+from contextlib import nullcontext
+from game_utils import CARDS
+
+# --- Shuffle Subsystem ---
+# A shoe's order is an array of card ids (see game_utils.shoe). Orders come from a
+# selectable RNG:
+#   random  - the Mersenne Twister of the random module (what shoes used so far)
+#   secrets - the OS CSPRNG (random.SystemRandom), for production fairness
+#   numpy   - a seeded NumPy Generator (PCG64), reproducible for simulations,
+#             and it shuffles whole batches of shoes in one call
+# A shoe_pool keeps a bounded stock of ready orders, refilled by a background thread,
+# so dealing a fresh shoe takes an order off a deque instead of shuffling in the round.
+
+RNGS = ("random", "secrets", "numpy")
+POOL_SIZE = 256     # Ready orders per shoe size
+# Orders shuffled per producer step. Only NumPy gains from big batches, the others shuffle
+# one order at a time anyway and a short step keeps the RNG lock free for an empty pool's caller.
+REFILL_BATCH = {"numpy": 64, "random": 4, "secrets": 4}
+
+class shuffle_rng:
+    def __init__(self, kind="random", seed=None):
+        if kind not in RNGS:
+            raise ValueError(f"Unknown RNG: {kind}")
+        self.kind = kind
+        # The pool's producer and an empty pool's caller can share the generator.
+        # The OS CSPRNG keeps no state in the process, so it needs no lock.
+        self.lock = threading.Lock() if kind != "secrets" else nullcontext()
+        if kind == "numpy":
+            import numpy as np # Only needed for this RNG
+            self.np = np
+            self.gen = np.random.default_rng(seed)
+        elif kind == "secrets":
+            self.gen = random.SystemRandom() # Ignores seeds by design
+        else:
+            self.gen = random.Random(seed)
+
+    def orders(self, decks, count):
+        """`count` freshly shuffled orders of a `decks` deck shoe, as arrays of card ids"""
+        base = array('B', range(len(CARDS))) * decks
+        with self.lock:
+            if self.kind == "numpy":
+                ids = self.np.frombuffer(base, dtype=self.np.uint8)
+                rows = self.gen.permuted(self.np.broadcast_to(ids, (count, len(ids))), axis=1)
+                return [array('B', row.tobytes()) for row in rows]
+            result = []
+            for _ in range(count):
+                order = array('B', base)
+                self.gen.shuffle(order)
+                result.append(order)
+            return result
+
+class inline_shuffler:
+    """Shuffles each shoe with the chosen RNG when it is needed, no pool"""
+    def __init__(self, decks, rng):
+        self.decks = decks
+        self.rng = rng
+
+    def take(self):
+        return self.rng.orders(self.decks, 1)[0]
+
+class shoe_pool:
+    """
+    Ready shuffled orders for shoes of one size. Pass it to shoe() as its shuffler:
+    shoe.shuffle() then calls take(). Thread safe, take() never waits on the producer.
+    """
+    def __init__(self, decks, rng, size=POOL_SIZE, on_miss=None):
+        self.decks = decks
+        self.rng = rng
+        self.size = size
+        self.on_miss = on_miss # Called when the pool was empty, e.g. a metrics counter
+        self.batch = REFILL_BATCH[rng.kind]
+        self.misses = 0
+        self.ready = deque()
+        self.wakeup = threading.Event()
+        self.wakeup.set()
+        threading.Thread(target=self.producer, name=f"shoe-pool-{decks}", daemon=True).start()
+
+    def take(self):
+        try:
+            order = self.ready.popleft()
+        except IndexError:
+            # The producer fell behind: shuffle here rather than wait for it
+            self.misses += 1
+            if self.on_miss:
+                self.on_miss()
+            order = self.rng.orders(self.decks, 1)[0]
+        if len(self.ready) < self.size // 2:
+            self.wakeup.set()
+        return order
+
+    def producer(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            while len(self.ready) < self.size:
+                self.ready.extend(self.rng.orders(self.decks, min(self.batch, self.size - len(self.ready))))
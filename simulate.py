@@ -0,0 +1,91 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from game_utils import bcolors
+from rules import DEFAULT_SPEC, parse_rules
+from simulator import POLICIES, simulate, simulate_objects, sim_result
+
+# --- Parallel Simulation Runner ---
+# Splits the hands into fixed-size shards. Shard i always gets the i-th stream
+# spawned from the master seed, so the merged result depends only on the seed,
+# hand count and shard size, never on how many workers ran the shards.
+
+SHARD_SIZE = 1_000_000
+Z_95 = 1.96
+
+def run_shard(engine, hands, policy, seed, rules):
+    """Plays one shard in a worker process"""
+    if engine == "objects":
+        # The object path uses the `random` module, seeded from the shard's stream
+        return simulate_objects(hands, policy, int(seed.generate_state(1)[0]), rules)
+    return simulate(hands, policy, seed, rules=rules)
+
+def shard_plan(hands, shard_size, seed):
+    """[(hands, seed sequence)] for every shard"""
+    sizes = [shard_size] * (hands // shard_size)
+    if hands % shard_size:
+        sizes.append(hands % shard_size)
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+def confidence(result):
+    """95% half-widths for the win rate and the expected value per hand"""
+    n = result.hands
+    win = result.wins / n
+    ev = result.expected_value()
+    # Naturals and doubles pay more than one unit, so E[x^2] is summed per hand
+    ev_var = result.units_sq / n - ev * ev
+    return Z_95 * math.sqrt(win * (1 - win) / n), Z_95 * math.sqrt(max(ev_var, 0) / n)
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel blackjack simulation")
+    parser.add_argument("--hands", type=int, default=100_000_000)
+    parser.add_argument("--policy", choices=list(POLICIES), default='basic')
+    parser.add_argument("--seed", type=int, default=1, help="master seed, the run is reproducible from it")
+    parser.add_argument("--rules", default=DEFAULT_SPEC, help=f"rule set spec (default: {DEFAULT_SPEC})")
+    parser.add_argument("--decks", type=int, default=None, help="shoe size, overrides the rule set's")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="hands per shard (part of the seed: change it and the run changes)")
+    parser.add_argument("--engine", choices=["numpy", "objects"], default="numpy",
+                        help="numpy batches or the deck/player/dealer/game classes")
+    args = parser.parse_args()
+    rules = parse_rules(args.rules, args.decks)
+
+    plan = shard_plan(args.hands, args.shard_size, args.seed)
+    print(f"{bcolors.HEADER}{args.hands:,} hands in {len(plan)} shards on {args.workers} workers "
+          f"(seed {args.seed}, {args.engine}, {rules}){bcolors.ENDC}")
+
+    start = time.perf_counter()
+    total = sim_result()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_shard, args.engine, n, args.policy, seed, rules) for n, seed in plan]
+        shard_of = {future: i for i, future in enumerate(futures)}
+        # Shards are merged in shard order whatever order they finish in: float unit sums
+        # (e.g. 6:5 naturals pay 1.2) depend on the order they are added up in
+        finished = [None] * len(futures)
+        merged = 0
+        for done, future in enumerate(as_completed(futures), 1):
+            finished[shard_of[future]] = future.result()
+            if finished[merged] is None:
+                continue
+            while merged < len(finished) and finished[merged] is not None:
+                total.merge(finished[merged])
+                finished[merged] = None
+                merged += 1
+            win_ci, ev_ci = confidence(total)
+            print(f"[{done}/{len(plan)}] {total.hands:,} hands  "
+                  f"win {total.wins / total.hands:.4%} +/- {win_ci:.4%}  "
+                  f"EV {total.expected_value():+.5f} +/- {ev_ci:.5f}", flush=True)
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(total.report())
+    win_ci, ev_ci = confidence(total)
+    print(f"95% CI: win rate +/- {win_ci:.4%}, EV +/- {ev_ci:.5f}")
+    print(f"{bcolors.BOLD}{total.hands / elapsed * 60:,.0f} hands/min{bcolors.ENDC}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import time
+import numpy as np
+from game_utils import *
+from rules import DEFAULT_RULES, DEFAULT_SPEC, HAND_BUST, HAND_NATURAL, MSG_LOSS, MSG_TIE, MSG_WIN, parse_rules
+from strategy import basic_strategy
+
+# --- Monte Carlo Simulator ---
+# Plays hands in NumPy batches with the same rules as the game classes:
+# every hand is dealt from a freshly shuffled shoe (player, dealer, player, dealer),
+# Aces count 11 unless that busts, the dealer draws by the rule set's dealer_hits table
+# (S17 or H17) and results and units come from its settle/payout tables, so a natural
+# pays the blackjack payout and a player bust loses even if the dealer busts too.
+# The dealer hand is always played out so the dealer statistics cover every hand.
+
+BATCH_SIZE = 100_000
+# Dealer final totals tracked per upcard: 17, 18, 19, 20, 21, bust
+DEALER_FINALS = ['17', '18', '19', '20', '21', 'bust']
+UPCARD_NAMES = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+
+def shoe_values(decks=1):
+    """Card values of a shoe (Ace = 11), the order of CARDS"""
+    return np.array([c.value() for c in CARDS] * decks, dtype=np.int8)
+
+# --- Player Policies ---
+# A policy decides hit (True) or stand from (total, soft, dealer upcard value).
+
+def hit_below_17(total, soft, upcard):
+    """Plays like the dealer"""
+    return total < 17
+
+def never_bust(total, soft, upcard):
+    """Only hits when no card can bust the hand"""
+    return total <= 11 or (soft and total < 21)
+
+POLICIES = {
+    'basic': basic_strategy,
+    'dealer': hit_below_17,
+    'never_bust': never_bust,
+}
+
+def policy_table(decide):
+    """Compiles a policy into a [soft][total][upcard] lookup array"""
+    table = np.zeros((2, 32, 12), dtype=bool)
+    for soft in (0, 1):
+        for total in range(4, 22):
+            for up in range(2, 12):
+                table[soft, total, up] = decide(total, bool(soft), up)
+    return table
+
+class sim_result:
+    """
+    Counts from a simulation run. Results of separate runs can be merged.
+    """
+    def __init__(self):
+        self.hands = 0
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.player_busts = 0
+        self.units = 0.0    # Won on a 1 unit bet per hand, naturals at the payout
+        self.units_sq = 0.0 # Sum of squared hand results, for the EV's variance
+        # dealer_finals[upcard index][final index], upcard index 0-9 = 2..Ace
+        self.dealer_finals = np.zeros((len(UPCARD_NAMES), len(DEALER_FINALS)), dtype=np.int64)
+
+    def merge(self, other):
+        self.hands += other.hands
+        self.wins += other.wins
+        self.losses += other.losses
+        self.ties += other.ties
+        self.player_busts += other.player_busts
+        self.units += other.units
+        self.units_sq += other.units_sq
+        self.dealer_finals += other.dealer_finals
+        return self
+
+    def expected_value(self):
+        """Average units won per hand"""
+        return self.units / self.hands if self.hands else 0.0
+
+    def bust_rates(self):
+        """Dealer bust probability for each upcard"""
+        totals = self.dealer_finals.sum(axis=1)
+        return self.dealer_finals[:, -1] / np.maximum(totals, 1)
+
+    def report(self):
+        lines = [
+            f"Hands: {self.hands:,}",
+            f"Win {self.wins / self.hands:.4%}  Loss {self.losses / self.hands:.4%}  "
+            f"Tie {self.ties / self.hands:.4%}  Player bust {self.player_busts / self.hands:.4%}",
+            f"Expected value per hand: {self.expected_value():+.5f}",
+            "Dealer final totals by upcard:",
+            "  up   " + "".join(f"{name:>8}" for name in DEALER_FINALS),
+        ]
+        shares = self.dealer_finals / np.maximum(self.dealer_finals.sum(axis=1, keepdims=True), 1)
+        for name, row in zip(UPCARD_NAMES, shares):
+            lines.append(f"  {name:<5}" + "".join(f"{p:8.2%}" for p in row))
+        return "\n".join(lines)
+
+def add_card(total, soft, value):
+    """Adds card values to hands (in place on the given arrays), counting Aces as 1 when 11 would bust"""
+    total += value
+    soft += value == 11
+    # At most two Aces can be soft here (A+A), so two passes settle every hand
+    for _ in range(2):
+        fix = (total > 21) & (soft > 0)
+        total[fix] -= 10
+        soft[fix] -= 1
+
+def rule_tables(rules):
+    """The rule set's tables as arrays: dealer_hits[soft][total], settle and payout[player][dealer]"""
+    return (np.array(rules.dealer_hits), np.array(rules.settle, dtype=np.uint8),
+            np.array(rules.payout, dtype=np.float64))
+
+def hand_slots(total, cards):
+    """rules.hand_slot over arrays of hands"""
+    return np.where(total > 21, HAND_BUST, np.where((total == 21) & (cards == 2), HAND_NATURAL, total))
+
+def deal_shoes(rng, n, values):
+    """
+    The top of n independently shuffled shoes: the first round_cards() cards of each,
+    all a hand can reach. A partial Fisher-Yates shuffle per row draws just those, without
+    replacement, instead of permuting the whole shoe (6 decks are 312 cards for ~20 used).
+    """
+    k = round_cards(len(values) // len(CARDS))
+    shoes = np.tile(values, (n, 1))
+    rows = np.arange(n)
+    for j in range(k):
+        pick = rng.integers(j, len(values), size=n)
+        top = shoes[rows, pick]
+        shoes[rows, pick] = shoes[:, j]
+        shoes[:, j] = top
+    return shoes[:, :k]
+
+def play_batch(rng, n, table, values, tables):
+    """Plays n hands and returns their sim_result"""
+    dealer_hits, settle, payout = tables
+    shoes = deal_shoes(rng, n, values)
+
+    p_total = shoes[:, 0].astype(np.int16)
+    p_soft = (shoes[:, 0] == 11).astype(np.int8)
+    add_card(p_total, p_soft, shoes[:, 2])
+    d_total = shoes[:, 1].astype(np.int16)
+    d_soft = (shoes[:, 1] == 11).astype(np.int8)
+    add_card(d_total, d_soft, shoes[:, 3])
+    upcard = shoes[:, 1]
+    next_card = np.full(n, 4, dtype=np.intp)
+    p_cards = np.full(n, 2, dtype=np.int16)
+
+    # Player: draw while the policy says hit and the hand is not busted
+    rows = np.arange(n)
+    active = rows[table[(p_soft > 0).view(np.int8), np.minimum(p_total, 31), upcard]]
+    while active.size:
+        drawn = shoes[active, next_card[active]]
+        next_card[active] += 1
+        p_cards[active] += 1
+        t, s = p_total[active], p_soft[active]
+        add_card(t, s, drawn)
+        p_total[active], p_soft[active] = t, s
+        hit = (t <= 21) & table[(s > 0).view(np.int8), np.minimum(t, 31), upcard[active]]
+        active = active[hit]
+
+    # Dealer: draws while the rules say hit
+    first = next_card.copy()
+    active = rows[dealer_hits[(d_soft > 0).view(np.int8), d_total]]
+    while active.size:
+        drawn = shoes[active, next_card[active]]
+        next_card[active] += 1
+        t, s = d_total[active], d_soft[active]
+        add_card(t, s, drawn)
+        d_total[active], d_soft[active] = t, s
+        active = active[dealer_hits[(s > 0).view(np.int8), np.minimum(t, 31)]]
+
+    result = sim_result()
+    d_bust = d_total > 21
+    p_slot = hand_slots(p_total, p_cards)
+    d_slot = hand_slots(d_total, 2 + next_card - first)
+    codes = settle[p_slot, d_slot]
+    units = payout[p_slot, d_slot]
+    result.hands = n
+    result.player_busts = int((p_total > 21).sum())
+    result.wins = int((codes == MSG_WIN).sum())
+    result.ties = int((codes == MSG_TIE).sum())
+    result.losses = n - result.wins - result.ties
+    result.units = float(units.sum())
+    result.units_sq = float((units * units).sum())
+    final = np.where(d_bust, len(DEALER_FINALS) - 1, d_total - 17)
+    np.add.at(result.dealer_finals, (upcard - 2, final), 1)
+    return result
+
+def simulate(hands, policy='basic', seed=None, decks=None, batch_size=BATCH_SIZE, rules=DEFAULT_RULES):
+    """
+    Plays `hands` hands with a policy (a name in POLICIES or a decide function) under a
+    rule set, from shoes of `decks` decks (default: the rule set's).
+    The same seed, hand count and batch size always give the same result.
+    """
+    decide = POLICIES[policy] if isinstance(policy, str) else policy
+    table = policy_table(decide)
+    values = shoe_values(rules.decks if decks is None else decks)
+    tables = rule_tables(rules)
+    rng = np.random.default_rng(seed)
+    result = sim_result()
+    while result.hands < hands:
+        result.merge(play_batch(rng, min(batch_size, hands - result.hands), table, values, tables))
+    return result
+
+def simulate_objects(hands, policy='basic', seed=None, rules=DEFAULT_RULES, decks=None):
+    """
+    The same simulation one object at a time with shoe/player/dealer/game, for comparison.
+    Like simulate(), every hand is dealt from a fresh shoe of `decks` decks (default: the rule set's).
+    """
+    decide = POLICIES[policy] if isinstance(policy, str) else policy
+    random.seed(seed)
+    p = player("Sim")
+    d = dealer(rules=rules)
+    g = game(d, p, shoe(rules.decks if decks is None else decks, 0.0))
+    result = sim_result()
+    for _ in range(hands):
+        g.start_round()
+        up = d.hand[0].value()
+        while not p.is_busted() and decide(p.total, p.soft, up):
+            p.receive_card(g.deck.deal())
+        d.play_turn(g.deck)
+        result.hands += 1
+        final = len(DEALER_FINALS) - 1 if d.is_busted() else d.total - 17
+        result.dealer_finals[up - 2, final] += 1
+        code, units = rules.outcome(p.total, len(p.hand), d.total, len(d.hand))
+        result.player_busts += p.is_busted()
+        result.wins += code == MSG_WIN
+        result.losses += code == MSG_LOSS
+        result.ties += code == MSG_TIE
+        result.units += units
+        result.units_sq += units * units
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Single core blackjack Monte Carlo simulation")
+    parser.add_argument("--hands", type=int, default=10_000_000)
+    parser.add_argument("--policy", choices=list(POLICIES), default='basic')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rules", default=DEFAULT_SPEC, help=f"rule set spec (default: {DEFAULT_SPEC})")
+    parser.add_argument("--decks", type=int, default=None, help="shoe size, overrides the rule set's")
+    parser.add_argument("--compare", type=int, default=0, metavar="HANDS",
+                        help="also time this many hands through the object-by-object path")
+    args = parser.parse_args()
+    rules = parse_rules(args.rules, args.decks)
+
+    start = time.perf_counter()
+    result = simulate(args.hands, args.policy, args.seed, rules=rules)
+    elapsed = time.perf_counter() - start
+    print(result.report())
+    print(f"{bcolors.BOLD}NumPy: {args.hands / elapsed * 60:,.0f} hands/min{bcolors.ENDC}")
+
+    if args.compare:
+        start = time.perf_counter()
+        simulate_objects(args.compare, args.policy, args.seed, rules)
+        elapsed = time.perf_counter() - start
+        print(f"{bcolors.BOLD}Objects: {args.compare / elapsed * 60:,.0f} hands/min{bcolors.ENDC}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import struct
+from functools import lru_cache
+
+# --- Hit/Stand Strategy Tables ---
+# A strategy table holds one hit/stand decision for every (player total, soft/hard, dealer upcard).
+# On the wire it is a 35 byte bitmap (bit set = hit), sent by batch clients so the
+# server can play their decisions without a round trip per card.
+
+HARD_TOTALS = range(4, 22)   # 4..21
+SOFT_TOTALS = range(12, 22)  # A+A (12) .. 21
+UPCARDS = range(2, 12)       # 2..10, Ace = 11
+TABLE_ENTRIES = (len(HARD_TOTALS) + len(SOFT_TOTALS)) * len(UPCARDS)
+TABLE_SIZE = (TABLE_ENTRIES + 7) // 8
+
+def table_index(total, soft, upcard):
+    """Position of a decision in the table"""
+    if soft:
+        row = len(HARD_TOTALS) + min(max(total, 12), 21) - 12
+    else:
+        row = min(max(total, 4), 21) - 4
+    return row * len(UPCARDS) + upcard - 2
+
+def basic_strategy(total, soft, upcard):
+    """Textbook hit/stand decision (stand on all 17, no doubles or splits)"""
+    if soft:
+        if total <= 17:
+            return True
+        return total == 18 and upcard >= 9
+    if total <= 11:
+        return True
+    if total == 12:
+        return not 4 <= upcard <= 6
+    if total <= 16:
+        return upcard >= 7
+    return False
+
+def encode_table(decide=basic_strategy):
+    """Packs decide(total, soft, upcard) -> bool into the wire bitmap"""
+    bits = bytearray(TABLE_SIZE)
+    for soft, totals in ((False, HARD_TOTALS), (True, SOFT_TOTALS)):
+        for total in totals:
+            for up in UPCARDS:
+                if decide(total, soft, up):
+                    i = table_index(total, soft, up)
+                    bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+def decode_table(data):
+    """Unpacks the wire bitmap into a list of bools indexed by table_index"""
+    return [bool(data[i >> 3] & (1 << (i & 7))) for i in range(TABLE_ENTRIES)]
+
+# --- Exact Solver ---
+# A composition counts the cards left by value: slot 0 = Ace, slots 1-8 = 2..9, slot 9 = 10/J/Q/K.
+# Dealer outcomes are exact for a composition (memoized recursion over the cards the dealer
+# can draw). Player EVs use the composition left after the upcard as the draw odds, so a
+# table depends on the player total and soft/hard only, not on which cards make the total.
+
+FULL_DECK = (4, 4, 4, 4, 4, 4, 4, 4, 4, 16)
+SLOT_VALUES = (11, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+# Dealer final totals: 17, 18, 19, 20, 21, bust
+FINALS = 6
+
+# Bound on memoized dealer states, composition-dependent play keeps adding new compositions
+DEALER_CACHE_SIZE = 1 << 15
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".strategy_cache")
+CACHE_MAGIC = b"BJST"
+CACHE_VERSION = 1
+
+def value_slot(value):
+    """Composition slot of a card value (Ace = 11)"""
+    return 0 if value == 11 else value - 1
+
+def add_value(total, soft, value):
+    """(total, soft) after drawing a card, an Ace counts 1 when 11 would bust"""
+    total += value
+    if value == 11:
+        if soft:
+            total -= 10 # Only one Ace can count as 11
+        soft = True
+    if total > 21 and soft:
+        total -= 10
+        soft = False
+    return total, soft
+
+@lru_cache(maxsize=DEALER_CACHE_SIZE)
+def dealer_finals(total, soft, comp, hit_soft_17=False):
+    """
+    Probabilities of the dealer ending on 17, 18, 19, 20, 21 or busting,
+    from (total, soft) with the cards in comp left to draw. Stands on all 17
+    unless hit_soft_17 (H17), then it draws to a soft 17.
+    """
+    if total > 21:
+        return (0.0,) * (FINALS - 1) + (1.0,)
+    if total >= 17 and not (total == 17 and soft and hit_soft_17):
+        return tuple(1.0 if i == total - 17 else 0.0 for i in range(FINALS))
+    left = sum(comp)
+    probs = [0.0] * FINALS
+    for slot, count in enumerate(comp):
+        if not count:
+            continue
+        rest = comp[:slot] + (count - 1,) + comp[slot + 1:]
+        sub = dealer_finals(*add_value(total, soft, SLOT_VALUES[slot]), rest, hit_soft_17)
+        weight = count / left
+        for i in range(FINALS):
+            probs[i] += weight * sub[i]
+    return tuple(probs)
+
+def dealer_distribution(upcard, comp, hit_soft_17=False):
+    """Dealer final-total probabilities for an upcard value, comp still including the upcard"""
+    slot = value_slot(upcard)
+    rest = comp[:slot] + (comp[slot] - 1,) + comp[slot + 1:]
+    return dealer_finals(*add_value(0, False, upcard), rest, hit_soft_17)
+
+def stand_ev(total, finals):
+    """Expected units won by standing on total against the dealer's final-total probabilities"""
+    ev = finals[-1] # Dealer busts
+    for i in range(FINALS - 1):
+        if total > 17 + i:
+            ev += finals[i]
+        elif total < 17 + i:
+            ev -= finals[i]
+    return ev
+
+def player_evs(finals, comp):
+    """
+    {(total, soft): (stand EV, hit EV)} for every live total, playing on optimally after a hit.
+    """
+    left = sum(comp)
+    draws = [(SLOT_VALUES[slot], count / left) for slot, count in enumerate(comp) if count]
+    evs = {}
+
+    def best(total, soft):
+        if total > 21:
+            return -1.0
+        if (total, soft) not in evs:
+            stand = stand_ev(total, finals)
+            # Hitting a hard 21 always busts, skip the recursion
+            hit = -1.0 if total == 21 and not soft else sum(p * best(*add_value(total, soft, v)) for v, p in draws)
+            evs[(total, soft)] = (stand, hit)
+        return max(evs[(total, soft)])
+
+    for total in SOFT_TOTALS:
+        best(total, True)
+    for total in HARD_TOTALS:
+        best(total, False)
+    return evs
+
+class solved_strategy:
+    """
+    Dealer final-total probabilities per upcard and the optimal hit/stand table for a rule set.
+    should_hit is a single table lookup.
+    """
+    def __init__(self, dealer, bitmap):
+        self.dealer = dealer # {upcard: (p17, p18, p19, p20, p21, p_bust)}
+        self.bitmap = bitmap # Wire format, see encode_table
+        self.table = decode_table(bitmap)
+
+    def should_hit(self, total, soft, upcard):
+        return self.table[table_index(total, soft, upcard)]
+
+def solve(decks=1, hit_soft_17=False):
+    """
+    Solves the hit/stand table from scratch for S17 or H17, at even money. The blackjack
+    payout doesn't change a hit/stand decision, a natural is never played.
+    """
+    comp = tuple(count * decks for count in FULL_DECK)
+    dealer = {}
+    decisions = {}
+    for up in UPCARDS:
+        dealer[up] = dealer_distribution(up, comp, hit_soft_17)
+        slot = value_slot(up)
+        rest = comp[:slot] + (comp[slot] - 1,) + comp[slot + 1:]
+        for (total, soft), (stand, hit) in player_evs(dealer[up], rest).items():
+            decisions[(total, soft, up)] = hit > stand
+    bitmap = encode_table(lambda total, soft, up: decisions.get((total, soft, up), False))
+    return solved_strategy(dealer, bitmap)
+
+def rule_key(decks=1, hit_soft_17=False):
+    """Names the rule set a cached table was solved for"""
+    return f"{'h17' if hit_soft_17 else 's17'}-{decks}d"
+
+def load_strategy(decks=1, hit_soft_17=False):
+    """
+    The solved table for a rule set, read from CACHE_DIR and solved (then cached) on first use.
+    Cache file: magic (4), version (1), dealer probabilities (10 x 6 doubles), table bitmap.
+    """
+    path = os.path.join(CACHE_DIR, rule_key(decks, hit_soft_17) + ".bin")
+    layout = struct.Struct(f"!4sB{len(UPCARDS) * FINALS}d{TABLE_SIZE}s")
+    try:
+        with open(path, "rb") as f:
+            magic, version, *rest = layout.unpack(f.read())
+        if magic == CACHE_MAGIC and version == CACHE_VERSION:
+            probs, bitmap = rest[:-1], rest[-1]
+            dealer = {up: tuple(probs[i * FINALS:(i + 1) * FINALS]) for i, up in enumerate(UPCARDS)}
+            return solved_strategy(dealer, bitmap)
+    except (OSError, struct.error):
+        pass
+
+    solved = solve(decks, hit_soft_17)
+    probs = [p for up in UPCARDS for p in solved.dealer[up]]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(layout.pack(CACHE_MAGIC, CACHE_VERSION, *probs, solved.bitmap))
+    os.replace(tmp, path)
+    return solved